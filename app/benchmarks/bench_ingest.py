@@ -0,0 +1,123 @@
+"""
+Offline end-to-end ingestion benchmark.
+
+Runs `import_metrics` against recorded GitHub API responses served by
+`github_replay.py`, so throughput can be measured reproducibly without
+network access or a token. Without `--archive`, the synthetic API stub is
+recorded once into a temporary archive and that recording is replayed.
+
+Every run imports into a fresh database and reports wall time, requests,
+throttled responses and stored rows per second.
+
+Usage (from the `app` directory):
+    python benchmarks/bench_ingest.py --archive benchmarks/fixtures/github.jsonl.gz --latency 0.05
+    python benchmarks/bench_ingest.py --orgs 5 --days 28 --teams 50 --team-metrics --repeat 3
+    python benchmarks/bench_ingest.py --seats 20000 --seat-metrics --rate-limit 50
+"""
+import argparse
+import logging
+import os
+import re
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from typing import List
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import github_replay  # noqa: E402
+import github_stub  # noqa: E402
+
+
+def _start(server) -> str:
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def record_synthetic(path: str, orgs: List[str], args) -> None:
+    """Record one import from the synthetic stub into `path`."""
+    from utils.import_ghcp import import_metrics
+
+    server = github_stub.serve(0, github_stub.StubState(args.teams, args.days, seats=args.seats))
+    os.environ.update({"GITHUB_API_URL": _start(server), "GITHUB_API_RECORD": path})
+    try:
+        import_metrics()
+    finally:
+        del os.environ["GITHUB_API_RECORD"]
+        server.shutdown()
+
+
+def count_rows(db_path: str) -> dict:
+    conn = sqlite3.connect(db_path)
+    counts = {table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+              for table in ("metrics", "team_metrics", "seats")}
+    conn.close()
+    return counts
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--archive", help="Recording to replay (default: record the synthetic stub first)")
+    parser.add_argument("--orgs", type=int, default=3, help="Synthetic orgs to record")
+    parser.add_argument("--days", type=int, default=28, help="Synthetic days per org")
+    parser.add_argument("--teams", type=int, default=20, help="Synthetic teams per org")
+    parser.add_argument("--seats", type=int, default=1000, help="Synthetic seats per org")
+    parser.add_argument("--team-metrics", action="store_true", help="Also import team metrics (TEAM_METRICS)")
+    parser.add_argument("--seat-metrics", action="store_true", help="Also import seats (SEAT_METRICS)")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every replayed response")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--rate-limit", type=int, help="Replayed requests per window before answering 429")
+    parser.add_argument("--window", type=float, default=1.0)
+    parser.add_argument("--repeat", type=int, default=1)
+    args = parser.parse_args()
+
+    logging.getLogger("streamlit").setLevel(logging.ERROR)
+    tmp_dir = tempfile.TemporaryDirectory()
+    os.environ.update({
+        "GHCP_TOKEN": "offline",
+        "TEAM_METRICS": str(args.team_metrics).lower(),
+        "SEAT_METRICS": str(args.seat_metrics).lower(),
+    })
+    for name in ("PERSISTENT_STORAGE", "RETENTION_DAYS", "REPLICA_MODE"):
+        os.environ.pop(name, None)
+
+    archive = args.archive
+    if archive:
+        orgs = sorted({match.group(1) for url in github_replay.load_archive(archive)
+                       if (match := re.match(r"^/orgs/([^/]+)/copilot/metrics", url))})
+    else:
+        orgs = [f"org-{i}" for i in range(args.orgs)]
+        archive = os.path.join(tmp_dir.name, "synthetic.jsonl.gz")
+        os.environ.update({"ORG_LIST": ",".join(orgs), "DB_NAME": os.path.join(tmp_dir.name, "record.db")})
+        record_synthetic(archive, orgs, args)
+        print(f"Recorded {len(github_replay.load_archive(archive))} synthetic responses into {archive}")
+    os.environ["ORG_LIST"] = ",".join(orgs)
+
+    from utils.import_ghcp import import_metrics
+
+    timings = []
+    for run in range(args.repeat):
+        server = github_replay.serve(0, archive, args.latency, args.jitter, args.rate_limit, args.window)
+        db_path = os.path.join(tmp_dir.name, f"run-{run}.db")
+        os.environ.update({"GITHUB_API_URL": _start(server), "DB_NAME": db_path})
+        start = time.perf_counter()
+        import_metrics()
+        elapsed = time.perf_counter() - start
+        server.shutdown()
+        throttle = server.RequestHandlerClass.throttle
+        rows = count_rows(db_path)
+        total = sum(rows.values())
+        timings.append(elapsed)
+        print(f"run {run + 1}: {elapsed:6.2f}s  requests {throttle.served} ({throttle.served / elapsed:.0f}/s)  "
+              f"throttled {throttle.throttled}  rows {rows}  {total / elapsed:.0f} rows/s")
+
+    if len(timings) > 1:
+        print(f"median {statistics.median(timings):.2f}s over {len(timings)} runs for {len(orgs)} orgs")
+    tmp_dir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Compare peak memory of list-based and streaming metric loading.
+
+Builds a synthetic database (unless one is given), then measures with
+tracemalloc the peak Python allocations of:
+
+* `load_metrics` followed by `build_chart_frames` on the materialized list
+* `build_chart_frames` fed directly by the `iter_metrics` generator
+
+Usage (from the `app` directory):
+    python benchmarks/bench_load_metrics.py --days 365 --orgs 20
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from synthetic_db import generate  # noqa: E402
+
+
+def measure(label: str, func) -> None:
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<12} peak {peak / 1024 / 1024:8.1f} MiB  time {elapsed:6.2f}s  rows {len(result['df'])}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", help="Existing database to benchmark instead of a synthetic one")
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--orgs", type=int, default=20)
+    args = parser.parse_args()
+
+    tmp_dir = None
+    db_path = args.db
+    if not db_path:
+        tmp_dir = tempfile.TemporaryDirectory()
+        db_path = os.path.join(tmp_dir.name, "synthetic.db")
+        print(f"Generated {generate(db_path, args.days, args.orgs)} rows in {db_path}")
+    os.environ["DB_NAME"] = os.path.abspath(db_path)
+
+    import utils.helpers as helpers
+
+    date_range = (date.today() - timedelta(days=args.days), date.today())
+    orgs = helpers.get_org_options()
+
+    measure("list", lambda: helpers.build_chart_frames(helpers.load_metrics(date_range, orgs), [], [], []))
+    measure("streaming", lambda: helpers.build_chart_frames(helpers.iter_metrics(date_range, orgs), [], [], []))
+
+    if tmp_dir:
+        tmp_dir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Replay recorded GitHub API responses from a local server.
+
+Record an import once with `GITHUB_API_RECORD` set, e.g. (from `app/src`):
+    GITHUB_API_RECORD=../benchmarks/fixtures/github.jsonl.gz python -c \
+        "from utils.import_ghcp import import_metrics; import_metrics()"
+
+then serve the archive without network access or a token (from the `app` directory):
+    python benchmarks/github_replay.py benchmarks/fixtures/github.jsonl.gz --latency 0.1
+    GITHUB_API_URL=http://127.0.0.1:8766 ...
+
+Responses keep their recorded status, body, `Link` and rate-limit headers.
+`Link` URLs are rewritten to point at the replay server. `--latency` and
+`--jitter` delay every response. `--rate-limit` answers with 429 and
+`Retry-After` once more than that many requests arrive within `--window`
+seconds, like a throttled token. Requests that were never recorded get a 404.
+"""
+import argparse
+import gzip
+import json
+import random
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+
+def load_archive(path: str) -> Dict[str, dict]:
+    """Read a recording into {request path: response}; later recordings of a path win."""
+    responses = {}
+    with gzip.open(path, "rt", encoding="utf-8") as archive:
+        for line in archive:
+            entry = json.loads(line)
+            responses[entry["url"]] = entry
+    return responses
+
+
+class Throttle:
+    """Sliding-window request limit shared by all handler threads, with request counters."""
+
+    def __init__(self, limit: Optional[int], window: float) -> None:
+        self.limit = limit
+        self.window = window
+        self.requests: deque = deque()
+        self.served = 0
+        self.throttled = 0
+        self._lock = threading.Lock()
+
+    def retry_after(self) -> Optional[float]:
+        """Register a request; return seconds to wait if it exceeds the limit, else None."""
+        now = time.monotonic()
+        with self._lock:
+            if not self.limit:
+                self.served += 1
+                return None
+            while self.requests and now - self.requests[0] >= self.window:
+                self.requests.popleft()
+            if len(self.requests) >= self.limit:
+                self.throttled += 1
+                return self.window - (now - self.requests[0])
+            self.requests.append(now)
+            self.served += 1
+        return None
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    responses: Dict[str, dict] = {}
+    latency = 0.0
+    jitter = 0.0
+    throttle = Throttle(None, 1.0)
+
+    def log_message(self, format: str, *args) -> None:  # noqa: A002
+        pass
+
+    def do_GET(self) -> None:  # noqa: N802
+        delay = self.latency + random.uniform(0, self.jitter)
+        if delay:
+            time.sleep(delay)
+        wait = self.throttle.retry_after()
+        if wait is not None:
+            self._send(429, {"Retry-After": str(max(1, round(wait)))}, b'{"message": "rate limited"}')
+            return
+        entry = self.responses.get(self.path)
+        if entry is None:
+            self._send(404, {}, b'{"message": "Not Found (not recorded)"}')
+            return
+        headers = dict(entry["headers"])
+        if "Link" in headers:
+            headers["Link"] = headers["Link"].replace(entry["base"], f"http://{self.headers.get('Host')}")
+        self._send(entry["status"], headers, entry["body"].encode())
+
+    def _send(self, status: int, headers: Dict[str, str], body: bytes) -> None:
+        self.send_response(status)
+        headers.setdefault("Content-Type", "application/json")
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def serve(port: int, archive: str, latency: float = 0.0, jitter: float = 0.0,
+          rate_limit: Optional[int] = None, window: float = 1.0) -> ThreadingHTTPServer:
+    """Create a replay server on 127.0.0.1:`port` (0 picks a free port); call `serve_forever` to run it."""
+    handler = type("Handler", (ReplayHandler,), {
+        "responses": load_archive(archive),
+        "latency": latency,
+        "jitter": jitter,
+        "throttle": Throttle(rate_limit, window),
+    })
+    return ThreadingHTTPServer(("127.0.0.1", port), handler)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("archive", help="Recording written with GITHUB_API_RECORD")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Extra random delay of up to this many seconds")
+    parser.add_argument("--rate-limit", type=int, help="Requests allowed per window before answering 429")
+    parser.add_argument("--window", type=float, default=1.0, help="Rate-limit window in seconds")
+    args = parser.parse_args()
+    server = serve(args.port, args.archive, args.latency, args.jitter, args.rate_limit, args.window)
+    print(f"Replaying {len(server.RequestHandlerClass.responses)} responses on http://127.0.0.1:{server.server_address[1]}")
+    server.serve_forever()
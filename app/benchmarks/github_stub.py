@@ -0,0 +1,151 @@
+"""
+Local stub of the GitHub Copilot API serving synthetic data.
+
+Serves the endpoints used by the import routines with `Link` pagination:
+    /orgs/{org}/copilot/metrics
+    /orgs/{org}/teams
+    /orgs/{org}/team/{team}/copilot/metrics
+    /orgs/{org}/copilot/billing/seats
+
+Point the importer at it with `GITHUB_API_URL=http://127.0.0.1:8765`; any
+token is accepted.
+
+Usage (from the `app` directory):
+    python benchmarks/github_stub.py --port 8765 --teams 200 --days 28 --seats 20000
+"""
+import argparse
+import json
+import random
+import re
+import time
+from collections import namedtuple
+from datetime import date, datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from synthetic_db import make_payload
+
+
+# A paginated list wrapped in an object, e.g. {"total_seats": n, "seats": [...]}
+Envelope = namedtuple("Envelope", ["key", "items", "total_key"])
+
+
+class StubState:
+    """Synthetic org data served by the stub."""
+
+    def __init__(self, teams: int = 20, days: int = 28, page_size: int = 100, latency: float = 0.0,
+                 seats: int = 100) -> None:
+        self.teams = [f"team-{i}" for i in range(teams)]
+        self.seat_count = seats
+        self._seats: Dict[str, List[dict]] = {}
+        self.days = days
+        self.page_size = page_size
+        self.latency = latency
+
+    def metrics(self, seed: str) -> List[dict]:
+        rng = random.Random(seed)
+        today = date.today()
+        return [make_payload(today - timedelta(days=offset), rng) for offset in range(self.days, 0, -1)]
+
+
+    def seats(self, org: str) -> List[dict]:
+        """Seats with a stable assignment date; about a quarter were never used."""
+        if org in self._seats:
+            return self._seats[org]
+        rng = random.Random(org)
+        now = datetime.now(timezone.utc).replace(microsecond=0)
+        seats = []
+        for i in range(self.seat_count):
+            created = now - timedelta(days=rng.randint(1, 365))
+            idle_days = rng.choice([None, rng.randint(0, 3), rng.randint(0, 30), rng.randint(0, 120)])
+            active = None if idle_days is None else max(created, now - timedelta(days=idle_days, minutes=rng.randint(0, 1439)))
+            seats.append({
+                "created_at": created.isoformat(),
+                "updated_at": created.isoformat(),
+                "pending_cancellation_date": None,
+                "last_activity_at": active.isoformat() if active else None,
+                "last_activity_editor": rng.choice(["vscode/1.95.0", "JetBrains-IU/241", "neovim/0.10"]) if active else None,
+                "plan_type": "business",
+                "assignee": {"login": f"user-{i}", "id": i, "type": "User"},
+                "assigning_team": {"slug": rng.choice(self.teams)} if self.teams and rng.random() < 0.5 else None,
+            })
+        self._seats[org] = seats
+        return seats
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    state: StubState = StubState()
+    extra_routes: List[Tuple[str, Callable]] = []
+
+    def log_message(self, format: str, *args) -> None:  # noqa: A002
+        pass
+
+    def _routes(self) -> List[Tuple[str, Callable]]:
+        return self.extra_routes + [
+            (r"^/orgs/([^/]+)/copilot/metrics$", lambda org: self.state.metrics(org)),
+            (r"^/orgs/([^/]+)/teams$", lambda org: [{"slug": t, "name": t} for t in self.state.teams]),
+            (r"^/orgs/([^/]+)/team/([^/]+)/copilot/metrics$", lambda org, team: self.state.metrics(f"{org}/{team}")),
+            (r"^/orgs/([^/]+)/copilot/billing/seats$",
+             lambda org: Envelope("seats", self.state.seats(org), "total_seats")),
+        ]
+
+    def do_GET(self) -> None:  # noqa: N802
+        if self.state.latency:
+            time.sleep(self.state.latency)
+        url = urlparse(self.path)
+        for pattern, handler in self._routes():
+            match = re.match(pattern, url.path)
+            if match:
+                self._send_page(url, handler(*match.groups()))
+                return
+        self.send_error(404)
+
+    def _send_page(self, url, items) -> None:
+        if isinstance(items, dict):
+            body, link = items, None
+        else:
+            envelope = items if isinstance(items, Envelope) else None
+            if envelope:
+                items = envelope.items
+            query = parse_qs(url.query)
+            page = int(query.get("page", ["1"])[0])
+            per_page = int(query.get("per_page", [str(self.state.page_size)])[0])
+            body = items[(page - 1) * per_page:page * per_page]
+            if envelope:
+                body = {envelope.total_key: len(items), envelope.key: body}
+            link = None
+            if page * per_page < len(items):
+                host = self.headers.get("Host")
+                link = f'<http://{host}{url.path}?page={page + 1}&per_page={per_page}>; rel="next"'
+        payload = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        if link:
+            self.send_header("Link", link)
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+def serve(port: int, state: Optional[StubState] = None, routes: Optional[Dict[str, Callable]] = None) -> ThreadingHTTPServer:
+    """Create a stub server on 127.0.0.1:`port` (0 picks a free port); call `serve_forever` to run it."""
+    handler = type("Handler", (StubHandler,), {
+        "state": state or StubState(),
+        "extra_routes": list((routes or {}).items()),
+    })
+    return ThreadingHTTPServer(("127.0.0.1", port), handler)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--teams", type=int, default=20)
+    parser.add_argument("--days", type=int, default=28)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--seats", type=int, default=100, help="Seats assigned in every org")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every response")
+    args = parser.parse_args()
+    server = serve(args.port, StubState(args.teams, args.days, args.page_size, args.latency, args.seats))
+    print(f"Serving GitHub API stub on http://127.0.0.1:{server.server_address[1]}")
+    server.serve_forever()
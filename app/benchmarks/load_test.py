@@ -0,0 +1,152 @@
+"""
+Concurrent-session load test for the Streamlit pages.
+
+Drives `pages/1_charts.py` and `pages/2_db_browser.py` with N simulated
+sessions built on Streamlit's `AppTest`. Every session runs in its own thread,
+as sessions do inside a Streamlit server, and repeatedly changes the sidebar
+filters against a synthetic database. Authentication is stubbed out.
+
+Reports p50/p95/p99 rerun latency per page and the peak RSS of the process.
+
+Usage (from the `app` directory):
+    python benchmarks/load_test.py --sessions 8 --iterations 10
+"""
+import argparse
+import os
+import random
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from typing import Dict, List
+from unittest import mock
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC_DIR)
+
+from synthetic_db import generate  # noqa: E402
+
+PAGES = {
+    "charts": os.path.join(SRC_DIR, "pages", "1_charts.py"),
+    "db_browser": os.path.join(SRC_DIR, "pages", "2_db_browser.py"),
+}
+
+
+def _random_range(rng: random.Random, days: int) -> tuple:
+    end = date.today() - timedelta(days=rng.randint(0, max(days // 4, 1)))
+    start = end - timedelta(days=rng.randint(1, max(days // 2, 2)))
+    return start, end
+
+
+def _random_orgs(rng: random.Random, orgs: List[str]) -> List[str]:
+    return rng.sample(orgs, rng.randint(1, len(orgs)))
+
+
+def _timed_run(at, page: str, session_id: int) -> float:
+    """Rerun the script and return its latency, failing the session if the run raised."""
+    start = time.perf_counter()
+    at.run()
+    elapsed = time.perf_counter() - start
+    if at.exception:
+        raise RuntimeError(f"{page} session {session_id} failed: {at.exception[0].value}")
+    return elapsed
+
+
+def run_session(page: str, session_id: int, iterations: int, days: int, orgs: List[str],
+                timeout: float) -> List[float]:
+    """
+    Simulate one user session and return the latency of every rerun in seconds.
+
+    The first run loads the page; each following iteration changes the date
+    range or the organisation filter and reruns the script.
+    """
+    from streamlit.testing.v1 import AppTest
+
+    rng = random.Random(session_id)
+    at = AppTest.from_file(PAGES[page], default_timeout=timeout)
+    at.session_state["token"] = "load-test"
+    latencies = [_timed_run(at, page, session_id)]
+
+    for _ in range(iterations):
+        if page == "charts":
+            if rng.random() < 0.5:
+                at.sidebar.date_input[0].set_value(_random_range(rng, days))
+            else:
+                at.sidebar.multiselect[0].set_value(_random_orgs(rng, orgs))
+        else:
+            start_date, end_date = _random_range(rng, days)
+            at.sidebar.date_input[0].set_value(start_date)
+            at.sidebar.date_input[1].set_value(end_date)
+            at.sidebar.multiselect[0].set_value(_random_orgs(rng, orgs))
+        latencies.append(_timed_run(at, page, session_id))
+    return latencies
+
+
+def _percentiles(values: List[float]) -> Dict[str, float]:
+    cuts = statistics.quantiles(values, n=100, method="inclusive")
+    return {"p50": cuts[49], "p95": cuts[94], "p99": cuts[98], "max": max(values)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", help="Existing database to test against instead of a synthetic one")
+    parser.add_argument("--sessions", type=int, default=8, help="Concurrent sessions per page")
+    parser.add_argument("--iterations", type=int, default=10, help="Filter changes per session")
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--orgs", type=int, default=5)
+    parser.add_argument("--pages", nargs="+", choices=sorted(PAGES), default=sorted(PAGES))
+    parser.add_argument("--cache-mb", type=int, help="Override CHART_CACHE_MAX_MB (0 disables the chart cache)")
+    parser.add_argument("--timeout", type=float, default=120, help="Per-rerun timeout in seconds")
+    args = parser.parse_args()
+
+    tmp_dir = None
+    db_path = args.db
+    if not db_path:
+        tmp_dir = tempfile.TemporaryDirectory()
+        db_path = os.path.join(tmp_dir.name, "synthetic.db")
+        print(f"Generated {generate(db_path, args.days, args.orgs)} rows in {db_path}")
+    os.environ["DB_NAME"] = os.path.abspath(db_path)
+    if args.cache_mb is not None:
+        os.environ["CHART_CACHE_MAX_MB"] = str(args.cache_mb)
+
+    import utils.helpers as helpers
+    import utils.rebuild as rebuild
+
+    # Synthetic databases only hold raw payloads; fill the derived tables so the
+    # trend, chat and pull request panels are measured with data
+    rows, seconds = rebuild.run_rebuild(pending=True)
+    if rows:
+        print(f"Rebuilt derived tables from {rows} rows in {seconds:.1f}s")
+    orgs = helpers.get_org_options()
+
+    # Every session is treated as authenticated
+    with mock.patch("utils.auth_wrapper.validate_token", return_value=True):
+        for page in args.pages:
+            print(f"\n{page}: {args.sessions} sessions x {args.iterations + 1} reruns")
+            wall_start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=args.sessions) as pool:
+                futures = [
+                    pool.submit(run_session, page, i, args.iterations, args.days, orgs, args.timeout)
+                    for i in range(args.sessions)
+                ]
+                latencies = [latency for future in futures for latency in future.result()]
+            wall = time.perf_counter() - wall_start
+            stats = _percentiles(latencies)
+            print(
+                f"  reruns {len(latencies)}  throughput {len(latencies) / wall:.1f}/s  "
+                + "  ".join(f"{name} {value * 1000:.0f}ms" for name, value in stats.items())
+            )
+
+    # ru_maxrss is reported in kilobytes on Linux
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"\nPeak RSS: {peak_rss:.1f} MiB")
+
+    if tmp_dir:
+        tmp_dir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
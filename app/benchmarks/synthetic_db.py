@@ -0,0 +1,116 @@
+"""
+Generate a synthetic metrics database for benchmarks.
+
+Payloads follow the shape returned by the GitHub Copilot metrics API so the
+helpers in `utils/helpers.py` can process them unchanged.
+
+Usage:
+    python benchmarks/synthetic_db.py data/synthetic.db --days 365 --orgs 20
+"""
+import argparse
+import json
+import random
+import sqlite3
+from datetime import date, timedelta
+
+EDITORS = ["vscode", "jetbrains", "visualstudio", "neovim"]
+MODELS = ["default", "custom-model"]
+LANGUAGES = ["python", "typescript", "javascript", "go", "java", "csharp", "rust", "ruby", "markdown", "sql"]
+
+
+def make_payload(day: date, rng: random.Random) -> dict:
+    """Build one day of Copilot metrics for an organisation."""
+    editors = []
+    for editor in EDITORS:
+        models = []
+        for model in MODELS:
+            languages = []
+            for language in LANGUAGES:
+                suggested = rng.randint(50, 5000)
+                languages.append({
+                    "name": language,
+                    "total_engaged_users": rng.randint(1, 50),
+                    "total_code_suggestions": rng.randint(10, 1000),
+                    "total_code_acceptances": rng.randint(1, 300),
+                    "total_code_lines_suggested": suggested,
+                    "total_code_lines_accepted": rng.randint(0, suggested // 3),
+                })
+            models.append({
+                "name": model,
+                "is_custom_model": model != "default",
+                "total_engaged_users": rng.randint(1, 100),
+                "languages": languages,
+            })
+        editors.append({"name": editor, "total_engaged_users": rng.randint(1, 200), "models": models})
+
+    active = rng.randint(100, 500)
+    return {
+        "date": day.isoformat(),
+        "total_active_users": active,
+        "total_engaged_users": rng.randint(50, active),
+        "copilot_ide_code_completions": {"total_engaged_users": rng.randint(50, active), "editors": editors},
+        "copilot_ide_chat": {
+            "total_engaged_users": rng.randint(1, 100),
+            "editors": [{
+                "name": editor,
+                "total_engaged_users": rng.randint(1, 50),
+                "models": [{
+                    "name": "default",
+                    "is_custom_model": False,
+                    "total_engaged_users": rng.randint(1, 50),
+                    "total_chats": rng.randint(0, 500),
+                    "total_chat_insertion_events": rng.randint(0, 100),
+                    "total_chat_copy_events": rng.randint(0, 100),
+                }],
+            } for editor in EDITORS],
+        },
+        "copilot_dotcom_chat": {
+            "total_engaged_users": rng.randint(1, 50),
+            "models": [{"name": "default", "is_custom_model": False,
+                        "total_engaged_users": rng.randint(1, 50), "total_chats": rng.randint(0, 300)}],
+        },
+        "copilot_dotcom_pull_requests": {
+            "total_engaged_users": rng.randint(1, 20),
+            "repositories": [{
+                "name": f"repo-{i}",
+                "total_engaged_users": rng.randint(1, 10),
+                "models": [{"name": "default", "is_custom_model": False,
+                            "total_pr_summaries_created": rng.randint(0, 20),
+                            "total_engaged_users": rng.randint(1, 10)}],
+            } for i in range(5)],
+        },
+    }
+
+
+def generate(path: str, days: int, orgs: int, seed: int = 42) -> int:
+    """
+    Write `days` days of metrics for `orgs` organisations into the database at `path`.
+
+    Returns:
+        The number of rows inserted.
+    """
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS metrics (id INTEGER PRIMARY KEY AUTOINCREMENT, org TEXT, date TEXT, data TEXT)"
+    )
+    today = date.today()
+    rows = 0
+    for offset in range(days):
+        day = today - timedelta(days=offset)
+        batch = [(f"org-{i}", day.isoformat(), json.dumps(make_payload(day, rng))) for i in range(orgs)]
+        conn.executemany("INSERT INTO metrics (org, date, data) VALUES (?, ?, ?)", batch)
+        rows += len(batch)
+    conn.commit()
+    conn.close()
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", help="Path of the SQLite database to create")
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--orgs", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    print(f"Inserted {generate(args.path, args.days, args.orgs, args.seed)} rows into {args.path}")
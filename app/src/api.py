@@ -0,0 +1,207 @@
+"""
+Read-only JSON API exposing the dashboard aggregates.
+
+The API shares the aggregation engine and the chart cache with the Streamlit
+pages (`utils/helpers.py`, `utils/chart_cache.py`), so internal tools no longer
+need to scrape the dashboard. Responses carry an ETag derived from the data
+generation and the request, conditional GETs are answered with 304 before any
+aggregation runs, and large bodies are gzip compressed.
+
+Run locally from the `app` directory:
+    uvicorn api:app --app-dir src --port 8000
+"""
+import hashlib
+import os
+import secrets
+from datetime import date, timedelta
+from typing import Any, Callable, List, Optional
+
+from dotenv import load_dotenv
+from fastapi import Depends, FastAPI, HTTPException, Query, Request
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, Response
+import pandas as pd
+
+import utils.chart_cache as chart_cache
+import utils.helpers as helpers
+
+load_dotenv()
+
+DEFAULT_RANGE_DAYS = 7
+
+app = FastAPI(title="GitHub Copilot Stats API", docs_url="/api/docs", openapi_url="/api/openapi.json")
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
+
+def _anonymous_access_allowed() -> bool:
+    return os.getenv("API_ALLOW_ANONYMOUS", "false").strip().lower() in ("1", "true", "yes")
+
+
+def require_api_token(request: Request) -> None:
+    """
+    Check the bearer token against `API_TOKEN`.
+
+    Without a configured token every request is refused, since the API
+    returns user logins; `API_ALLOW_ANONYMOUS=true` opts out explicitly.
+
+    Raises:
+        HTTPException: If no token is configured, or the token is missing or does not match.
+    """
+    expected = os.getenv("API_TOKEN")
+    if not expected:
+        if _anonymous_access_allowed():
+            return
+        raise HTTPException(status_code=503, detail="API_TOKEN is not configured; set it or API_ALLOW_ANONYMOUS=true")
+    auth_header = request.headers.get("Authorization", "")
+    scheme, _, token = auth_header.partition(" ")
+    if scheme.lower() != "bearer" or not secrets.compare_digest(token, expected):
+        raise HTTPException(status_code=401, detail="Invalid or missing API token",
+                            headers={"WWW-Authenticate": "Bearer"})
+
+
+def _date_range(start: Optional[date], end: Optional[date]) -> tuple:
+    end = end or date.today()
+    start = start or end - timedelta(days=DEFAULT_RANGE_DAYS)
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+    return start, end
+
+
+def _etag(request: Request) -> str:
+    """Build a weak ETag from the data generation, the path and the normalized query."""
+    query = "&".join(f"{k}={v}" for k, v in sorted(request.query_params.multi_items()))
+    # Today's date is included because omitted date bounds default relative to it
+    raw = f"{helpers.get_data_generation()}|{date.today().isoformat()}|{request.url.path}|{query}"
+    return 'W/"' + hashlib.sha256(raw.encode()).hexdigest()[:32] + '"'
+
+
+def _conditional(request: Request, build: Callable[[], Any]) -> Response:
+    """Return 304 when the client's ETag is current, otherwise build the JSON payload."""
+    etag = _etag(request)
+    headers = {"ETag": etag, "Cache-Control": "private, max-age=0, must-revalidate"}
+    if_none_match = request.headers.get("If-None-Match", "")
+    if etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(build(), headers=headers)
+
+
+def _frame_records(df: pd.DataFrame) -> List[dict]:
+    """Convert a frame to JSON-ready records with ISO dates and no NaN values."""
+    if df.empty:
+        return []
+    out = df.copy()
+    for column in out.columns:
+        if pd.api.types.is_datetime64_any_dtype(out[column]):
+            out[column] = out[column].dt.strftime("%Y-%m-%d")
+    out = out.astype(object).where(pd.notna(out), None)
+    return out.to_dict(orient="records")
+
+
+@app.get("/api/health")
+def health() -> dict:
+    return {"status": "ok"}
+
+
+@app.get("/api/orgs", dependencies=[Depends(require_api_token)])
+def orgs(request: Request) -> Response:
+    """List the organisations present in the database."""
+    return _conditional(request, lambda: {"orgs": helpers.get_org_options()})
+
+
+@app.get("/api/filters", dependencies=[Depends(require_api_token)])
+def filters(
+    request: Request,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    orgs: List[str] = Query(default=[]),
+    teams: List[str] = Query(default=[]),
+) -> Response:
+    """List the teams, editors, models and languages available for a date range and organisations."""
+    date_range = _date_range(start, end)
+
+    def build() -> dict:
+        editors, models, languages = chart_cache.get_filter_options(date_range, orgs, teams=teams)
+        return {"teams": chart_cache.get_team_options(orgs), "editors": editors, "models": models,
+                "languages": languages}
+
+    return _conditional(request, build)
+
+
+@app.get("/api/daily", dependencies=[Depends(require_api_token)])
+def daily(
+    request: Request,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    orgs: List[str] = Query(default=[]),
+    teams: List[str] = Query(default=[]),
+    editors: List[str] = Query(default=[]),
+    models: List[str] = Query(default=[]),
+    languages: List[str] = Query(default=[]),
+) -> Response:
+    """
+    Return per-org daily totals as shown on the metrics dashboard. Empty filters select everything.
+
+    With `teams`, rows come from the team-level metrics of those teams.
+    """
+    date_range = _date_range(start, end)
+
+    def build() -> dict:
+        frames = chart_cache.get_chart_frames(date_range, orgs, editors, models, languages, teams=teams)
+        return {
+            "start": date_range[0].isoformat(),
+            "end": date_range[1].isoformat(),
+            "rows": _frame_records(frames["df"]),
+        }
+
+    return _conditional(request, build)
+
+
+@app.get("/api/languages", dependencies=[Depends(require_api_token)])
+def languages(
+    request: Request,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    orgs: List[str] = Query(default=[]),
+    teams: List[str] = Query(default=[]),
+    editors: List[str] = Query(default=[]),
+    models: List[str] = Query(default=[]),
+    languages: List[str] = Query(default=[]),
+) -> Response:
+    """Return per-language suggestion statistics. Empty filters select everything."""
+    date_range = _date_range(start, end)
+
+    def build() -> dict:
+        frames = chart_cache.get_chart_frames(date_range, orgs, editors, models, languages, teams=teams)
+        lang_df = frames.get("lang_df", pd.DataFrame())
+        return {
+            "start": date_range[0].isoformat(),
+            "end": date_range[1].isoformat(),
+            "languages": _frame_records(lang_df),
+        }
+
+    return _conditional(request, build)
+
+
+@app.get("/api/trends", dependencies=[Depends(require_api_token)])
+def trends(
+    request: Request,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    orgs: List[str] = Query(default=[]),
+) -> Response:
+    """Return rolling averages and week-over-week deltas per organisation."""
+    date_range = _date_range(start, end)
+    return _conditional(request, lambda: {"rows": _frame_records(chart_cache.get_trend_metrics(date_range, orgs))})
+
+
+@app.get("/api/seats/inactive", dependencies=[Depends(require_api_token)])
+def inactive_seats(
+    request: Request,
+    days: int = Query(default=30, ge=1),
+    orgs: List[str] = Query(default=[]),
+) -> Response:
+    """Return assigned seats without Copilot activity in the last `days` days."""
+    return _conditional(request, lambda: {
+        "days": days,
+        "seats": _frame_records(chart_cache.get_inactive_seats(orgs, days)),
+    })
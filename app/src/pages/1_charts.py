@@ -1,9 +1,11 @@
 import streamlit as st
 import utils.helpers as helpers
+import utils.chart_cache as chart_cache
 from datetime import date, timedelta, datetime
 import pandas as pd
 import altair as alt
 from utils.auth_wrapper import require_auth
+from utils.background_import import import_progress
 
 @require_auth
 
@@ -14,6 +16,10 @@ def main():
 
     st.header("Metrics Dashboard")
 
+    # Imports run in the background; cached views stay available meanwhile
+    with st.sidebar:
+        import_progress(compact=True)
+
     # Date Range Selector
     today = date.today()
     default_start = today - timedelta(days=7)
@@ -26,30 +32,31 @@ def main():
     org_options = helpers.get_org_options()
     sel_orgs = st.sidebar.multiselect("Select Organizations", org_options, default=org_options)
 
-    # Load Records
-    records = helpers.load_metrics(date_range, sel_orgs)
+    # Team Selector (empty shows org-level metrics)
+    team_options = chart_cache.get_team_options(sel_orgs)
+    sel_teams = []
+    if team_options:
+        sel_teams = st.sidebar.multiselect("Select Teams", team_options, default=[],
+                                           help="Leave empty for organization-level metrics")
 
-    # Dynamic Filter Options
-    editors_opt, models_opt, languages_opt = helpers.get_filter_options(records)
+    # Dynamic Filter Options (shared across sessions through the chart cache)
+    editors_opt, models_opt, languages_opt = chart_cache.get_filter_options(date_range, sel_orgs, teams=sel_teams)
     sel_editors = st.sidebar.multiselect("Select Editors", editors_opt, default=editors_opt)
     sel_models = st.sidebar.multiselect("Select Models", models_opt, default=models_opt)
     sel_languages = st.sidebar.multiselect("Select Languages", languages_opt, default=languages_opt)
 
-    # Build DataFrame
-    df = helpers.build_dataframe(records, sel_editors, sel_models, sel_languages)
+    # Build chart-ready frames, reusing identical views computed by other sessions
+    frames = chart_cache.get_chart_frames(date_range, sel_orgs, sel_editors, sel_models, sel_languages,
+                                          teams=sel_teams)
+    df = frames["df"]
+
+    if sel_teams:
+        st.caption(f"Showing team-level metrics for: {', '.join(sel_teams)}. Users in several teams are counted once per team. Trends, chat and pull request panels stay organization-level.")
 
     if df.empty:
         st.info("No data available for selected filters.")
     else:
-        # Convert date column to datetime if not already
-        df['date'] = pd.to_datetime(df['date'])
-        
-        # Filter out weekends first
-        weekday_mask = df['date'].dt.weekday < 5
-        weekday_df = df[weekday_mask]
-        
-        # Then sum by day for weekdays only
-        daily_sums = weekday_df.groupby("date")[["active", "engaged", "inactive"]].sum()
+        daily_sums = frames["daily_sums"]
         
         # Calculate averages of daily sums
         st.subheader("Aggregated Metrics (Weekday Averages)")
@@ -67,7 +74,7 @@ def main():
         
         # --- Charts ---
         st.subheader("User Activity Over Time")
-        df_time = df.groupby("date")[["active", "engaged", "inactive"]].sum().reset_index()
+        df_time = frames["df_time"]
         chart1 = alt.Chart(df_time).transform_fold(
             ['active', 'engaged', 'inactive'],
             as_=['Metric', 'Count']
@@ -80,7 +87,7 @@ def main():
         st.altair_chart(chart1, use_container_width=True)
         
         st.subheader("Code Completions Over Time")
-        df_code = df.groupby("date")[["suggested", "accepted"]].sum().reset_index()
+        df_code = frames["df_code"]
         chart2 = alt.Chart(df_code).transform_fold(
             ['suggested', 'accepted'],
             as_=['Type', 'Lines']
@@ -94,24 +101,7 @@ def main():
         
         st.subheader("Acceptance Rate Over Time")
         
-        # Calculate overall acceptance rate by date
-        df_rate_overall = df.groupby("date").agg({
-            "accepted": "sum",
-            "suggested": "sum"
-        }).reset_index()
-        df_rate_overall["acceptance_rate"] = (df_rate_overall["accepted"] / df_rate_overall["suggested"] * 100)
-        df_rate_overall["org"] = "Overall"
-        
-        # Calculate per-org acceptance rate by date
-        df_rate_org = df.groupby(["date", "org"]).agg({
-            "accepted": "sum",
-            "suggested": "sum"
-        }).reset_index()
-        df_rate_org["acceptance_rate"] = (df_rate_org["accepted"] / df_rate_org["suggested"] * 100)
-        
-        # Combine overall and per-org rates
-        df_rate_combined = pd.concat([df_rate_overall[["date", "org", "acceptance_rate"]], 
-                                    df_rate_org[["date", "org", "acceptance_rate"]]])
+        df_rate_combined = frames["df_rate_combined"]
         
         # Create the combined chart
         chart3 = alt.Chart(df_rate_combined).mark_line(point=True).encode(
@@ -126,9 +116,49 @@ def main():
         
         st.altair_chart(chart3, use_container_width=True)
         
+        # --- Trends ---
+        st.subheader("Trends (Rolling Averages)")
+        st.caption("7-day and 28-day rolling averages per organization. Deltas are week-over-week changes of the 7-day values. Editor, model and language filters do not apply.")
+        trend_df = chart_cache.get_trend_metrics(date_range, sel_orgs)
+        if trend_df.empty:
+            st.info("No trend data available for selected organizations.")
+        else:
+            # Latest day per org, with WoW deltas on the 7-day values
+            latest = trend_df.groupby("org").tail(1)
+            for row in latest.itertuples():
+                st.markdown(f"**{row.org}** ({row.date:%Y-%m-%d})")
+                tcol1, tcol2, tcol3 = st.columns(3)
+                tcol1.metric(
+                    "Active Users (7d avg)", f"{row.active_7d:.1f}",
+                    delta=None if pd.isna(row.active_wow) else round(row.active_wow, 1),
+                    help=f"28-day average: {row.active_28d:.1f}"
+                )
+                tcol2.metric(
+                    "Engaged Users (7d avg)", f"{row.engaged_7d:.1f}",
+                    delta=None if pd.isna(row.engaged_wow) else round(row.engaged_wow, 1),
+                    help=f"28-day average: {row.engaged_28d:.1f}"
+                )
+                tcol3.metric(
+                    "Acceptance Rate (7d, %)", "n/a" if pd.isna(row.rate_7d) else f"{row.rate_7d:.2f}",
+                    delta=None if pd.isna(row.rate_wow) else round(row.rate_wow, 2),
+                    help=None if pd.isna(row.rate_28d) else f"28-day rate: {row.rate_28d:.2f}%"
+                )
+
+            trend_chart = alt.Chart(trend_df).transform_fold(
+                ['active_7d', 'active_28d', 'engaged_7d', 'engaged_28d'],
+                as_=['Metric', 'Users']
+            ).mark_line().encode(
+                x='date:T',
+                y='Users:Q',
+                color=alt.Color('org:N', title='Organization'),
+                strokeDash='Metric:N',
+                tooltip=['date:T', 'org:N', 'Metric:N', alt.Tooltip('Users:Q', format='.1f')]
+            ).properties(width=700, height=400)
+            st.altair_chart(trend_chart, use_container_width=True)
+        
         # --- Code Metrics ---
         st.subheader("Code Metrics")
-        lang_df = helpers.load_code_metrics(records, sel_editors, sel_models, sel_languages)
+        lang_df = frames["lang_df"]
         if lang_df.empty:
             st.info("No code metrics available for selected filters.")
         else:
@@ -164,5 +194,72 @@ def main():
                 })
             )
 
+        # --- Chat & Pull Requests (flattened at ingest, no JSON parsing here) ---
+        st.subheader("Chat Activity Over Time")
+        st.caption("Editor, model and language filters do not apply to chat and pull request metrics.")
+        ide_chat_df = chart_cache.get_flat_daily(
+            "flat_ide_chat", date_range, sel_orgs, ["chats", "insertion_events", "copy_events"]
+        )
+        dotcom_chat_df = chart_cache.get_flat_daily("flat_dotcom_chat", date_range, sel_orgs, ["chats"])
+        if ide_chat_df.empty and dotcom_chat_df.empty:
+            st.info("No chat metrics available for selected filters.")
+        else:
+            chat_df = pd.concat([
+                ide_chat_df.rename(columns={
+                    "chats": "IDE chats",
+                    "insertion_events": "IDE insertions",
+                    "copy_events": "IDE copies"
+                }),
+                dotcom_chat_df.rename(columns={"chats": "GitHub.com chats"})
+            ]).groupby("date").sum().reset_index()
+            chat_columns = [c for c in ["IDE chats", "IDE insertions", "IDE copies", "GitHub.com chats"] if c in chat_df]
+            chat_chart = alt.Chart(chat_df).transform_fold(
+                chat_columns,
+                as_=['Metric', 'Count']
+            ).mark_line(point=True).encode(
+                x='date:T',
+                y='Count:Q',
+                color='Metric:N',
+                tooltip=['date:T', 'Metric:N', 'Count:Q']
+            ).properties(width=700, height=400)
+            st.altair_chart(chat_chart, use_container_width=True)
+
+        st.subheader("Pull Request Summaries")
+        pr_df = chart_cache.get_flat_daily(
+            "flat_dotcom_pull_requests", date_range, sel_orgs, ["pr_summaries_created"], group_by=["repository"]
+        )
+        if pr_df.empty:
+            st.info("No pull request metrics available for selected filters.")
+        else:
+            pr_chart = alt.Chart(pr_df).mark_bar().encode(
+                x='date:T',
+                y=alt.Y('sum(pr_summaries_created):Q', title='PR Summaries Created'),
+                tooltip=['date:T', alt.Tooltip('sum(pr_summaries_created):Q', title='PR Summaries')]
+            ).properties(width=700, height=300)
+            st.altair_chart(pr_chart, use_container_width=True)
+
+            top_repos = (pr_df.groupby("repository")["pr_summaries_created"].sum()
+                         .sort_values(ascending=False).head(10).reset_index())
+            st.dataframe(top_repos.rename(columns={
+                "repository": "Repository",
+                "pr_summaries_created": "PR Summaries Created"
+            }))
+
+    # --- Seats (only shown when seat assignments were imported; independent of the metrics range) ---
+    inactive_days = st.sidebar.number_input("Seat inactivity threshold (days)", min_value=1, value=30)
+    seats_df = chart_cache.get_inactive_seats(sel_orgs, inactive_days)
+    if not seats_df.empty:
+        st.subheader("Inactive Seats")
+        st.caption(f"Assigned seats without Copilot activity in the last {inactive_days} days. "
+                   "Seats never used count from their assignment date.")
+        st.metric("Inactive Seats", len(seats_df))
+        st.dataframe(seats_df.drop(columns=["idle_since"]).rename(columns={
+            "org": "Organization",
+            "login": "User",
+            "last_activity_at": "Last Activity",
+            "last_activity_editor": "Last Editor",
+            "assigning_team": "Assigned Via Team"
+        }))
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
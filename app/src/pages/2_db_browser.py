@@ -1,8 +1,7 @@
 import streamlit as st
 import pandas as pd
 import json
-from utils.helpers import get_connection
-from datetime import datetime
+from utils.helpers import get_data_range, get_org_options, load_raw_metrics
 from st_aggrid import AgGrid, GridOptionsBuilder, GridUpdateMode
 from utils.auth_wrapper import require_auth
 
@@ -10,39 +9,28 @@ from utils.auth_wrapper import require_auth
 def main():
     st.title("Browse Metrics Database")
 
-    conn = get_connection()
-    cursor = conn.cursor()
-
-    # Get all data
-    cursor.execute("SELECT date, org, data FROM metrics ORDER BY date DESC")
-    rows = cursor.fetchall()
-    
-    # Create DataFrame
-    df = pd.DataFrame(rows, columns=['Date', 'Organization', 'Data'])
-    
-    if df.empty:
+    # Bounds come from index lookups; only the selected range is read afterwards
+    min_date, max_date = get_data_range()
+    if min_date is None:
         st.info("No data found in the database.")
-        conn.close()
         return
-        
-    df['Date'] = pd.to_datetime(df['Date'])
-    
+
     # Add filters in sidebar
     st.sidebar.header("Filters")
     
     # Date range picker
-    min_date = df['Date'].min()
-    max_date = df['Date'].max()
     start_date = st.sidebar.date_input("Start Date", min_date, min_value=min_date, max_value=max_date)
     end_date = st.sidebar.date_input("End Date", max_date, min_value=min_date, max_value=max_date)
     
     # Organization filter
-    orgs = df['Organization'].unique()
+    orgs = get_org_options()
     selected_orgs = st.sidebar.multiselect('Select Organizations', orgs, default=orgs)
-    
-    # Apply filters
-    mask = (df['Date'].dt.date >= start_date) & (df['Date'].dt.date <= end_date) & (df['Organization'].isin(selected_orgs))
-    filtered_df = df[mask].copy()
+    if not selected_orgs:
+        st.info("No data found for the selected filters.")
+        return
+
+    rows = load_raw_metrics((start_date, end_date), selected_orgs)
+    filtered_df = pd.DataFrame(rows, columns=['Date', 'Organization', 'Data'])
 
     # Create a display version of the DataFrame without the Data column
     display_df = filtered_df.copy()
@@ -119,7 +107,5 @@ def main():
     else:
         st.info("Select a row to view its details")
 
-    conn.close()
-
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -2,10 +2,11 @@ import streamlit as st
 import subprocess
 import os
 from datetime import datetime, timedelta
-from utils.import_ghcp import import_metrics
+from utils.background_import import get_status, import_progress, submit_import
 from utils.helpers import get_data_range
 from dotenv import load_dotenv
 from utils.auth_wrapper import require_auth
+import utils.replica as replica
 
 
 # Initialize session state for scheduler
@@ -26,7 +27,8 @@ def check_scheduled_import():
     if (st.session_state['last_import'] is None or 
         st.session_state['next_scheduled_import'] is None or 
         now >= st.session_state['next_scheduled_import']):
-        import_metrics()
+        # An import already running (e.g. started by another session) counts as this one
+        submit_import()
         st.session_state['last_import'] = now
         # Schedule next import for tomorrow at the same time
         st.session_state['next_scheduled_import'] = now + timedelta(days=1)
@@ -47,6 +49,13 @@ def loader():
     if min_date and max_date:
         st.info(f"📊 Data available from {min_date} to {max_date}")
     
+    # Show which role this replica plays when scaled out
+    if replica.is_leased_mode():
+        if replica.is_writer():
+            st.caption("Replica role: writer (holds the import lease)")
+        else:
+            st.caption("Replica role: read-only, imports run on the writer replica")
+    
     # Add scheduler control
     scheduler_enabled = st.checkbox(
         "Enable Daily Auto-Import", 
@@ -69,12 +78,12 @@ def loader():
         if st.session_state['next_scheduled_import']:
             st.caption(f"Next import scheduled for: {st.session_state['next_scheduled_import'].strftime('%Y-%m-%d %H:%M:%S')}")
     
-    # Manual import button
-    if st.button("Import Data Now"):
-        import_metrics()
-        st.session_state.last_import = datetime.now()
-        min_date, max_date = get_data_range()
+    # Manual import button; the import runs in the background and its progress is shown below
+    if st.button("Import Data Now", disabled=get_status()["running"]):
+        if submit_import():
+            st.session_state.last_import = datetime.now()
         st.rerun()
+    import_progress()
     
     if st.button("Export Database"):
         db_path = os.getenv("DB_NAME", "metrics.db")
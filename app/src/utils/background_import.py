@@ -0,0 +1,184 @@
+"""
+Background imports shared by every session of the Streamlit server.
+
+`submit_import` hands `run_import` to a process-wide executor with a single
+worker, so at most one import runs at a time however many sessions ask for
+one, and the script that asked returns immediately. Progress is kept in a
+module-level `ImportStatus` that every session reads. `import_progress`
+renders it in a fragment that polls, quickly while an import is running, so
+only that fragment reruns and the rest of the page keeps serving cached data.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import streamlit as st
+
+from utils.import_ghcp import ImportFailed, ImportReporter, configured_orgs, run_import
+
+# Seconds between progress refreshes while an import runs, and between
+# checks for an import started by another session while idle
+PROGRESS_REFRESH_SECONDS = 2
+IDLE_REFRESH_SECONDS = 30
+
+STAGE_LABELS = {
+    "queued": "Queued",
+    "fetching": "Fetching metrics",
+    "storing": "Storing",
+    "teams": "Importing teams",
+    "seats": "Importing seats",
+    "done": "Done",
+    "failed": "Failed",
+}
+
+logger = logging.getLogger(__name__)
+
+
+class ImportStatus:
+    """Thread-safe progress of the current (or last) import."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.running = False
+        self.started_at = None
+        self.finished_at = None
+        self.error = None
+        self.orgs = {}
+        self.messages = []
+
+    def start(self, orgs):
+        with self._lock:
+            self.running = True
+            self.started_at = datetime.now()
+            self.finished_at = None
+            self.error = None
+            self.orgs = {org: {"stage": "queued"} for org in orgs}
+            self.messages = []
+
+    def update(self, org, stage, **details):
+        with self._lock:
+            self.orgs[org] = {"stage": stage, **details}
+
+    def add_message(self, message):
+        with self._lock:
+            self.messages.append(message)
+
+    def finish(self, error=None):
+        with self._lock:
+            self.running = False
+            self.finished_at = datetime.now()
+            self.error = error
+
+    def snapshot(self):
+        """Return a consistent copy that can be rendered without holding the lock."""
+        with self._lock:
+            return {
+                "running": self.running,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+                "error": self.error,
+                "orgs": {org: dict(progress) for org, progress in self.orgs.items()},
+                "messages": list(self.messages),
+            }
+
+
+class _StatusReporter(ImportReporter):
+    def __init__(self, status):
+        super().__init__()
+        self.status = status
+
+    def update(self, org, stage, **details):
+        super().update(org, stage, **details)
+        self.status.update(org, stage, **details)
+
+    def warning(self, message):
+        super().warning(message)
+        self.status.add_message(message)
+
+
+_status = ImportStatus()
+_submit_lock = threading.Lock()
+_executor = None
+
+
+def _run():
+    try:
+        run_import(_StatusReporter(_status))
+        _status.finish()
+    except ImportFailed as exc:
+        _status.finish(str(exc))
+    except Exception as exc:
+        logger.exception("Background import failed")
+        _status.finish(f"Import failed: {exc}")
+
+
+def submit_import():
+    """
+    Start an import on the background worker unless one is already running.
+
+    Returns:
+        True if an import was started, False if one was already running.
+    """
+    global _executor
+    with _submit_lock:
+        if _status.running:
+            return False
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="metrics-import")
+        _status.start(configured_orgs())
+        _executor.submit(_run)
+    return True
+
+
+def get_status():
+    return _status.snapshot()
+
+
+def _render(compact, live):
+    status = get_status()
+    if status["running"] and not live:
+        # Another session started an import; rerun the page to poll at the faster rate
+        st.rerun()
+    if status["started_at"] is None:
+        return
+    orgs = status["orgs"]
+    finished = sum(1 for progress in orgs.values() if progress["stage"] in ("done", "failed"))
+    if status["running"]:
+        st.progress(finished / len(orgs) if orgs else 0.0,
+                    text=f"Importing in the background: {finished} of {len(orgs)} organizations")
+        if not compact:
+            st.dataframe(
+                [{"Organization": org, "Status": STAGE_LABELS.get(progress["stage"], progress["stage"]),
+                  "New rows": progress.get("rows", "")}
+                 for org, progress in orgs.items()],
+                hide_index=True,
+            )
+    elif not compact:
+        if status["error"]:
+            st.error(status["error"])
+        else:
+            st.caption(f"Last import finished at {status['finished_at']:%Y-%m-%d %H:%M:%S}")
+    if not compact:
+        for message in status["messages"]:
+            st.warning(message)
+
+    # Rerun the whole page once when an import this session watched has finished
+    if status["running"]:
+        st.session_state["import_watched"] = status["started_at"]
+    elif st.session_state.get("import_watched") == status["started_at"]:
+        st.session_state["import_watched"] = None
+        st.rerun()
+
+
+def import_progress(compact=False):
+    """
+    Show the progress of the background import.
+
+    Polls every `PROGRESS_REFRESH_SECONDS` while an import is running and every
+    `IDLE_REFRESH_SECONDS` otherwise, to notice imports started by other
+    sessions. `compact` shows only the progress bar, for sidebars.
+    """
+    live = get_status()["running"]
+    run_every = PROGRESS_REFRESH_SECONDS if live else IDLE_REFRESH_SECONDS
+    st.fragment(run_every=run_every)(_render)(compact, live)
@@ -0,0 +1,197 @@
+import os
+import threading
+import logging
+from collections import OrderedDict
+from datetime import date, timedelta
+import utils.helpers as helpers
+
+# Streamlit serves every session from the same Python process, so this
+# module-level cache is shared by all users of a replica.
+
+DEFAULT_MAX_MB = 64
+DEFAULT_VIEW_DAYS = 7
+
+logger = logging.getLogger(__name__)
+
+def _entry_size(value):
+    """Approximate the memory footprint of a cached value in bytes."""
+    if isinstance(value, dict):
+        return sum(_entry_size(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(_entry_size(v) for v in value)
+    if hasattr(value, "memory_usage"):
+        usage = value.memory_usage(deep=True)
+        return int(usage.sum()) if hasattr(usage, "sum") else int(usage)
+    return len(str(value))
+
+class ChartCache:
+    """Thread-safe LRU cache bounded by the approximate size of its entries."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._sizes = {}
+        self._orgs = {}
+        self._total = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key]
+
+    def put(self, key, value, orgs=()):
+        """Store a value; `orgs` are the orgs it was built from (empty for all orgs), see `invalidate`."""
+        size = _entry_size(value)
+        if size > self.max_bytes:
+            logger.info(f"Chart cache entry of {size} bytes exceeds budget, not cached")
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = value
+            self._sizes[key] = size
+            self._orgs[key] = frozenset(orgs or ())
+            self._total += size
+            while self._total > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        del self._entries[key]
+        del self._orgs[key]
+        self._total -= self._sizes.pop(key)
+
+    def invalidate(self, orgs):
+        """Drop the entries built from any of `orgs`, including all-org views. Returns how many were dropped."""
+        orgs = set(orgs)
+        with self._lock:
+            stale = [key for key, entry_orgs in self._orgs.items() if not entry_orgs or entry_orgs & orgs]
+            for key in stale:
+                self._remove(key)
+        return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+            self._orgs.clear()
+            self._total = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+_cache = ChartCache(int(os.getenv("CHART_CACHE_MAX_MB", DEFAULT_MAX_MB)) * 1024 * 1024)
+
+def get_cache():
+    return _cache
+
+def _normalize(values):
+    return tuple(sorted(v for v in values or () if v is not None))
+
+def _generation(orgs):
+    """Generation part of a cache key: per-org when orgs are selected, global for all-org views."""
+    return helpers.get_org_generations(orgs) if orgs else helpers.get_data_generation()
+
+def invalidate(orgs):
+    """Drop cached views that include any of `orgs`; views of other orgs are kept."""
+    dropped = _cache.invalidate(orgs)
+    logger.info(f"Invalidated {dropped} chart cache entries for {', '.join(orgs)}")
+    return dropped
+
+def make_key(kind, date_range, orgs, *selections, generation):
+    """Build a cache key from the normalized filter state and the data generation."""
+    start, end = date_range
+    return (kind, start.isoformat(), end.isoformat(), _normalize(orgs),
+            *(_normalize(sel) for sel in selections), generation)
+
+def get_filter_options(date_range, orgs, records=None, teams=None):
+    """Cached equivalent of `helpers.get_filter_options` for a date range, orgs and teams."""
+    key = make_key("options", date_range, orgs, teams, generation=_generation(orgs))
+    options = _cache.get(key)
+    if options is None:
+        if records is None:
+            options = helpers.load_filter_options(date_range, orgs, teams)
+        else:
+            options = helpers.get_filter_options(records)
+        _cache.put(key, options, orgs)
+    return options
+
+def get_chart_frames(date_range, orgs, sel_editors, sel_models, sel_languages, records=None, teams=None):
+    """
+    Return the chart-ready frames for a dashboard view, computing them on a miss.
+
+    Records are only streamed from the database when the view is not cached.
+    The returned frames are shared between sessions and must not be mutated.
+    """
+    key = make_key("frames", date_range, orgs, sel_editors, sel_models, sel_languages, teams,
+                   generation=_generation(orgs))
+    frames = _cache.get(key)
+    if frames is None:
+        if records is None:
+            frames = helpers.aggregate_chart_frames(date_range, orgs, sel_editors, sel_models, sel_languages, teams)
+        else:
+            frames = helpers.build_chart_frames(records, sel_editors, sel_models, sel_languages)
+        _cache.put(key, frames, orgs)
+    return frames
+
+def get_trend_metrics(date_range, orgs):
+    """Cached equivalent of `helpers.get_trend_metrics`."""
+    key = make_key("trends", date_range, orgs, generation=_generation(orgs))
+    trends = _cache.get(key)
+    if trends is None:
+        trends = helpers.get_trend_metrics(date_range, orgs)
+        _cache.put(key, trends, orgs)
+    return trends
+
+def get_flat_daily(table_name, date_range, orgs, metrics, group_by=(), filters=None):
+    """Cached equivalent of `helpers.load_flat_daily`."""
+    filters = filters or {}
+    kind = ("flat", table_name, tuple(metrics), tuple(group_by), tuple(sorted(filters)))
+    key = make_key(kind, date_range, orgs, *(filters[column] for column in sorted(filters)),
+                   generation=_generation(orgs))
+    df = _cache.get(key)
+    if df is None:
+        df = helpers.load_flat_daily(table_name, date_range, orgs, metrics, group_by, filters)
+        _cache.put(key, df, orgs)
+    return df
+
+def get_team_options(orgs):
+    """Cached equivalent of `helpers.get_team_options`."""
+    key = ("teams", _normalize(orgs), _generation(orgs))
+    teams = _cache.get(key)
+    if teams is None:
+        teams = helpers.get_team_options(orgs)
+        _cache.put(key, teams, orgs)
+    return teams
+
+def get_inactive_seats(orgs, days):
+    """Cached equivalent of `helpers.get_inactive_seats`; the key includes today since the cutoff moves daily."""
+    key = ("inactive_seats", days, date.today().isoformat(), _normalize(orgs), _generation(orgs))
+    df = _cache.get(key)
+    if df is None:
+        df = helpers.get_inactive_seats(orgs, days)
+        _cache.put(key, df, orgs)
+    return df
+
+def prewarm_default_view(days=DEFAULT_VIEW_DAYS):
+    """Populate the cache for the default dashboard view (last `days` days, all filters selected)."""
+    today = date.today()
+    date_range = (today - timedelta(days=days), today)
+    orgs = helpers.get_org_options()
+    editors, models, languages = get_filter_options(date_range, orgs)
+    get_chart_frames(date_range, orgs, editors, models, languages)
+    get_trend_metrics(date_range, orgs)
+    logger.info(f"Prewarmed chart cache for {date_range[0]} to {date_range[1]}")
@@ -0,0 +1,214 @@
+"""
+Declarative flattening of Copilot metric payloads into typed columnar rows.
+
+Every metric family of the daily payload is described once in `FLATTEN_SPEC`:
+the family key, the nested levels to walk (each contributing a dimension
+column from its `name`) and the metric columns read at the deepest level.
+`compile_spec` turns the spec into table DDL, insert statements and nested
+extractor closures once at import time, so ingest walks each payload in a
+single pass and the dashboard queries plain SQL tables instead of JSON.
+"""
+import hashlib
+import json
+
+# table name -> family key, nested levels (list key, dimension column) and metric columns (column -> payload field)
+FLATTEN_SPEC = {
+    "flat_ide_completions": {
+        "family": "copilot_ide_code_completions",
+        "levels": [("editors", "editor"), ("models", "model"), ("languages", "language")],
+        "metrics": {
+            "engaged_users": "total_engaged_users",
+            "code_suggestions": "total_code_suggestions",
+            "code_acceptances": "total_code_acceptances",
+            "lines_suggested": "total_code_lines_suggested",
+            "lines_accepted": "total_code_lines_accepted",
+        },
+    },
+    "flat_ide_chat": {
+        "family": "copilot_ide_chat",
+        "levels": [("editors", "editor"), ("models", "model")],
+        "metrics": {
+            "engaged_users": "total_engaged_users",
+            "chats": "total_chats",
+            "insertion_events": "total_chat_insertion_events",
+            "copy_events": "total_chat_copy_events",
+        },
+    },
+    "flat_dotcom_chat": {
+        "family": "copilot_dotcom_chat",
+        "levels": [("models", "model")],
+        "metrics": {
+            "engaged_users": "total_engaged_users",
+            "chats": "total_chats",
+        },
+    },
+    "flat_dotcom_pull_requests": {
+        "family": "copilot_dotcom_pull_requests",
+        "levels": [("repositories", "repository"), ("models", "model")],
+        "metrics": {
+            "engaged_users": "total_engaged_users",
+            "pr_summaries_created": "total_pr_summaries_created",
+        },
+    },
+}
+
+# Payload fields the retention job keeps when it compacts a row, per family (see utils/retention.py)
+COMPACTED_FIELDS = {
+    "copilot_ide_code_completions": ("total_code_lines_suggested", "total_code_lines_accepted"),
+}
+
+
+def _compile_levels(levels, metric_fields):
+    """Build a closure walking `levels` below a node and appending one tuple per leaf."""
+    if not levels:
+        def leaf(node, prefix, out):
+            out.append(prefix + tuple(int(node.get(field) or 0) for field in metric_fields))
+        return leaf
+
+    list_key = levels[0][0]
+    inner = _compile_levels(levels[1:], metric_fields)
+
+    def level(node, prefix, out):
+        for child in node.get(list_key) or ():
+            inner(child, prefix + (child.get("name") or "Unknown",), out)
+    return level
+
+
+class CompiledTable:
+    """One flattened table: its DDL, insert statement and extractor."""
+
+    def __init__(self, name, spec):
+        self.name = name
+        self.family = spec["family"]
+        self.dimensions = [column for _, column in spec["levels"]]
+        self.metrics = list(spec["metrics"])
+        self.columns = ["org", "date"] + self.dimensions + self.metrics
+        dimension_ddl = "".join(f"{column} TEXT NOT NULL, " for column in self.dimensions)
+        metric_ddl = ", ".join(f"{column} INTEGER NOT NULL" for column in self.metrics)
+        key = ", ".join(["org", "date"] + self.dimensions)
+        self.ddl = (
+            f"CREATE TABLE IF NOT EXISTS {name} (org TEXT NOT NULL, date TEXT NOT NULL, "
+            f"{dimension_ddl}{metric_ddl}, PRIMARY KEY ({key}))"
+        )
+        self.insert_sql = (
+            f"INSERT OR REPLACE INTO {name} ({', '.join(self.columns)}) "
+            f"VALUES ({', '.join('?' for _ in self.columns)})"
+        )
+        self.delete_sql = f"DELETE FROM {name} WHERE org = ? AND date = ?"
+        # Compacted payloads only carry some metrics; those are merged into the
+        # existing rows so the other columns keep the values flattened at ingest
+        carried = COMPACTED_FIELDS.get(self.family, ())
+        self.compacted_metrics = [column for column, field in spec["metrics"].items() if field in carried]
+        self.merge_compacted_sql = (
+            f"INSERT INTO {name} ({', '.join(self.columns)}) VALUES ({', '.join('?' for _ in self.columns)}) "
+            f"ON CONFLICT ({key}) DO UPDATE SET "
+            + ", ".join(f"{column} = excluded.{column}" for column in self.compacted_metrics)
+        ) if self.compacted_metrics else None
+        self._extract = _compile_levels(spec["levels"], list(spec["metrics"].values()))
+        # Changes whenever this table's spec entry changes, see `ensure_tables`
+        self.version = hashlib.sha1(json.dumps(spec, sort_keys=True).encode()).hexdigest()[:12]
+
+    def extract(self, org, rec_date, data, out):
+        family = data.get(self.family)
+        if family:
+            self._extract(family, (org, rec_date), out)
+
+
+def compile_spec(spec):
+    return {name: CompiledTable(name, table_spec) for name, table_spec in spec.items()}
+
+
+TABLES = compile_spec(FLATTEN_SPEC)
+
+# Changes whenever the spec changes, so checkpoints of a rebuild with another spec are not reused
+SPEC_VERSION = hashlib.sha1(json.dumps(FLATTEN_SPEC, sort_keys=True).encode()).hexdigest()[:12]
+
+
+def flatten_record(org, rec_date, data, compacted=False):
+    """
+    Extract the rows of every table from one payload. Returns {table name: [row tuples]}.
+
+    For a `compacted` payload only the tables with `compacted_metrics` are
+    extracted; the others keep their rows from before compaction.
+    """
+    rows = {}
+    for name, table in TABLES.items():
+        if compacted and not table.compacted_metrics:
+            continue
+        out = []
+        table.extract(org, rec_date, data, out)
+        rows[name] = out
+    return rows
+
+
+def ensure_tables(conn):
+    """
+    Create missing flattened tables and recreate the ones whose spec changed.
+
+    The spec version of every table is kept in `meta` under
+    `flatten_spec:<table>`. Tables created before that key existed are kept
+    if their columns still match the spec. Needs the `meta` table.
+
+    Returns:
+        The names of the tables that were (re)created empty, whose rows have
+        to be rebuilt from the stored payloads.
+    """
+    existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+    versions = dict(conn.execute("SELECT key, value FROM meta WHERE key LIKE 'flatten_spec:%'").fetchall())
+    created = []
+    for name, table in TABLES.items():
+        key = f"flatten_spec:{name}"
+        if name in existing and versions.get(key) != table.version:
+            columns = [row[1] for row in conn.execute(f"PRAGMA table_info({name})")]
+            if key in versions or columns != table.columns:
+                conn.execute(f"DROP TABLE {name}")
+                existing.discard(name)
+        if name not in existing:
+            conn.execute(table.ddl)
+            created.append(name)
+        if versions.get(key) != table.version:
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, table.version))
+    return created
+
+
+def store_flattened(conn, org, rec_date, data, compacted=False):
+    """
+    Replace the flattened rows of one (org, date) inside the caller's transaction.
+
+    Rows of a `compacted` payload are merged instead, see `flatten_record`.
+    """
+    for name, rows in flatten_record(org, rec_date, data, compacted).items():
+        table = TABLES[name]
+        if compacted:
+            conn.executemany(table.merge_compacted_sql, rows)
+            continue
+        conn.execute(table.delete_sql, (org, rec_date))
+        if rows:
+            conn.executemany(table.insert_sql, rows)
+
+
+def query_daily(conn, table_name, date_range, orgs, metrics, group_by=(), filters=None):
+    """
+    Sum `metrics` of a flattened table per date (and `group_by` dimensions).
+
+    Column names are validated against the compiled spec before being placed
+    in SQL. `filters` maps dimension columns to the allowed values; empty
+    selections are ignored like in the dashboard filters.
+    """
+    table = TABLES[table_name]
+    unknown = [c for c in list(metrics) + list(group_by) + list(filters or {})
+               if c not in table.metrics and c not in table.dimensions]
+    if unknown:
+        raise ValueError(f"Unknown columns for {table_name}: {unknown}")
+    keys = ["date"] + list(group_by)
+    query = (
+        f"SELECT {', '.join(keys)}, {', '.join(f'SUM({m}) AS {m}' for m in metrics)} "
+        f"FROM {table_name} WHERE date BETWEEN ? AND ?"
+    )
+    params = [date_range[0].isoformat(), date_range[1].isoformat()]
+    for column, values in [("org", orgs)] + list((filters or {}).items()):
+        if values:
+            query += f" AND {column} IN ({','.join('?' for _ in values)})"
+            params.extend(values)
+    query += f" GROUP BY {', '.join(keys)}"
+    return conn.execute(query, params).fetchall(), keys + list(metrics)
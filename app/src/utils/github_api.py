@@ -0,0 +1,143 @@
+"""
+Minimal GitHub REST client used by the import routines.
+
+Handles `Link` header pagination and waits out rate limits (HTTP 429, or 403
+with `X-RateLimit-Remaining: 0`). The base URL comes from `GITHUB_API_URL`
+so imports can run against GitHub Enterprise or a local stub of the API.
+Each thread gets its own `requests.Session`, which keeps connections alive
+across pages and lets concurrent fetchers run without sharing a session.
+
+With `GITHUB_API_RECORD` set to a `.jsonl.gz` path, every response is also
+appended to that archive with its status, body and the pagination and
+rate-limit headers (never the request's token). `benchmarks/github_replay.py`
+serves such an archive back for offline benchmarks.
+"""
+import gzip
+import json
+import logging
+import os
+import threading
+import time
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_API_URL = "https://api.github.com"
+API_VERSION = "2022-11-28"
+MAX_RATE_LIMIT_RETRIES = 3
+MAX_RATE_LIMIT_WAIT = 60
+# Seconds to establish a connection and to wait for data; a stalled request
+# raises requests.Timeout instead of hanging the single import worker
+CONNECT_TIMEOUT = 10
+DEFAULT_READ_TIMEOUT = 60
+
+# Response headers kept in recordings; the rest is not needed to replay an import
+RECORDED_HEADERS = (
+    "Content-Type", "ETag", "Link", "Retry-After",
+    "X-RateLimit-Limit", "X-RateLimit-Remaining", "X-RateLimit-Reset", "X-RateLimit-Resource", "X-RateLimit-Used",
+)
+
+_local = threading.local()
+_record_lock = threading.Lock()
+
+
+class GitHubAPIError(Exception):
+    """Raised when the API answers with a non-success status."""
+
+    def __init__(self, url, status_code):
+        super().__init__(f"GitHub API returned {status_code} for {url}")
+        self.url = url
+        self.status_code = status_code
+
+
+def api_url(path):
+    return os.getenv("GITHUB_API_URL", DEFAULT_API_URL).rstrip("/") + path
+
+
+def get_session():
+    """Return the `requests.Session` of the current thread."""
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = requests.Session()
+        _local.session = session
+    return session
+
+
+def headers(token):
+    return {
+        "Accept": "application/vnd.github+json",
+        "Authorization": f"Bearer {token}",
+        "X-GitHub-Api-Version": API_VERSION,
+    }
+
+
+def next_link(resp):
+    """Return the `rel="next"` URL of a paginated response, if any."""
+    links = resp.headers.get("Link")
+    if not links:
+        return None
+    for link in links.split(","):
+        if 'rel="next"' in link:
+            return link[link.find("<") + 1:link.find(">")]
+    return None
+
+
+def _rate_limit_wait(resp):
+    """Seconds to wait before retrying a rate-limited response, or None if it is not rate limited."""
+    if resp.status_code == 429 or (resp.status_code == 403 and resp.headers.get("X-RateLimit-Remaining") == "0"):
+        if "Retry-After" in resp.headers:
+            return float(resp.headers["Retry-After"])
+        reset = resp.headers.get("X-RateLimit-Reset")
+        return max(0.0, float(reset) - time.time()) if reset else 1.0
+    return None
+
+
+def record(url, resp):
+    """Append a response to the `GITHUB_API_RECORD` archive, if recording is enabled."""
+    path = os.getenv("GITHUB_API_RECORD")
+    if not path:
+        return
+    base = api_url("")
+    entry = {
+        "base": base,
+        "url": url[len(base):] if url.startswith(base) else url,
+        "status": resp.status_code,
+        "headers": {name: resp.headers[name] for name in RECORDED_HEADERS if name in resp.headers},
+        "body": resp.text,
+    }
+    line = json.dumps(entry) + "\n"
+    with _record_lock, gzip.open(path, "at", encoding="utf-8") as archive:
+        archive.write(line)
+
+
+def request_timeout():
+    return CONNECT_TIMEOUT, float(os.getenv("GITHUB_API_TIMEOUT", DEFAULT_READ_TIMEOUT))
+
+
+def get(url, token):
+    """GET a URL, retrying rate-limited responses a few times."""
+    for attempt in range(MAX_RATE_LIMIT_RETRIES + 1):
+        resp = get_session().get(url, headers=headers(token), timeout=request_timeout())
+        wait = _rate_limit_wait(resp)
+        if wait is None or attempt == MAX_RATE_LIMIT_RETRIES:
+            record(url, resp)
+            return resp
+        logger.warning(f"Rate limited on {url}, retrying in {min(wait, MAX_RATE_LIMIT_WAIT):.0f}s")
+        time.sleep(min(wait, MAX_RATE_LIMIT_WAIT))
+    return resp
+
+
+def iter_pages(url, token):
+    """
+    Yield the decoded JSON body of every page, following `Link` headers.
+
+    Raises:
+        GitHubAPIError: If a page cannot be fetched.
+    """
+    while url:
+        resp = get(url, token)
+        if resp.status_code != 200:
+            raise GitHubAPIError(url, resp.status_code)
+        yield resp.json()
+        url = next_link(resp)
@@ -2,20 +2,36 @@ import sqlite3
 import os
 from dotenv import load_dotenv
 import json
-from datetime import datetime
+from datetime import date
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
+import utils.replica as replica
+import utils.sharding as sharding
+import utils.flatten as flatten
+import utils.seats as seats
 
 # --- Database Setup ---
 
-def get_connection():
+def get_connection(org=None):
     """
     Get a connection to the SQLite database with improved error handling.
     Returns a connection object if successful or raises an exception with detailed error info.
+
+    With DB_LAYOUT=sharded, `org` selects the shard of that organisation and
+    no `org` returns the shard catalog, which also holds the data generation.
+    In the single-file layout `org` is ignored.
     """
     try:
         # Load environment variables if not already loaded
         load_dotenv()
         
+        if sharding.is_sharded():
+            if replica.is_leased_mode():
+                raise RuntimeError("REPLICA_MODE=leased is not supported with DB_LAYOUT=sharded")
+            if org is None:
+                return sharding.open_catalog()
+            return open_database(sharding.shard_path(org))
+        
         # Get database name from environment variables with fallback
         db_name = os.getenv("DB_NAME", "metrics.db")
         
@@ -32,32 +48,16 @@ def get_connection():
             os.makedirs(db_dir, exist_ok=True)
             print(f"Created directory: {db_dir}")
         
-        # Check if database file exists (will be created if not)
-        file_exists = os.path.isfile(db_path)
-        print(f"Database file '{db_path}' exists: {file_exists}")
-        
-        # Create connection
-        conn = sqlite3.connect(db_path, check_same_thread=False)
-        
-        # Create table if it doesn't exist
-        cursor = conn.cursor()
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='metrics'")
-        if not cursor.fetchone():
-            print(f"Creating metrics table in database: {db_path}")
-            cursor.execute(
-                """
-                CREATE TABLE metrics (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    org TEXT,
-                    date TEXT,
-                    data TEXT
-                )
-                """
-            )
-            conn.commit()
-            print("Table 'metrics' created successfully")
+        # Read-only replicas serve sessions from a snapshot of the shared database
+        if replica.is_read_only_replica():
+            if not replica.refresh_snapshot(db_path, prepare=_prepare_snapshot):
+                print(f"No shared database yet, creating empty snapshot: {db_path}")
+                init_conn = sqlite3.connect(db_path)
+                ensure_schema(init_conn)
+                init_conn.close()
+            return replica.open_read_only(db_path)
         
-        return conn
+        return open_database(db_path)
     
     except sqlite3.Error as e:
         error_msg = f"SQLite error: {str(e)}"
@@ -68,34 +68,363 @@ def get_connection():
         print(f"Error in get_connection(): {error_msg}")
         raise Exception(f"Database connection failed: {error_msg}")
 
+def _prepare_snapshot(db_path):
+    """Add the tables a shared database from an older version lacks to a replica's private copy."""
+    conn = sqlite3.connect(db_path)
+    try:
+        ensure_schema(conn)
+    finally:
+        conn.close()
+
+def open_database(db_path):
+    """Open a metrics database file, creating it and any missing tables."""
+    # Check if database file exists (will be created if not)
+    file_exists = os.path.isfile(db_path)
+    print(f"Database file '{db_path}' exists: {file_exists}")
+    
+    # Create connection
+    conn = sqlite3.connect(db_path, check_same_thread=False)
+    
+    ensure_schema(conn)
+    
+    return conn
+
+def _fan_out(orgs, func):
+    """
+    Run `func(conn, orgs)` against every database holding the selected orgs.
+
+    In the single-file layout this is a single call. With per-org shards each
+    shard is queried from a thread pool and the results are returned as a list
+    in org order, leaving the merge to the caller.
+    """
+    def run(org):
+        conn = get_connection(org)
+        try:
+            return func(conn, [org] if org is not None else orgs)
+        finally:
+            conn.close()
+
+    if not sharding.is_sharded():
+        return [run(None)]
+    shard_orgs = [org for org, _ in sharding.list_shards(orgs)]
+    if not shard_orgs:
+        return []
+    with ThreadPoolExecutor(max_workers=min(sharding.get_shard_workers(), len(shard_orgs))) as pool:
+        return list(pool.map(run, shard_orgs))
+
+def ensure_schema(conn):
+    """Create any missing tables on an open connection."""
+    cursor = conn.cursor()
+    cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='metrics'")
+    if not cursor.fetchone():
+        print("Creating metrics table")
+        # Must be set before the first table exists; lets retention reclaim pages in steps
+        cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        cursor.execute(
+            """
+            CREATE TABLE metrics (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                org TEXT,
+                date TEXT,
+                data TEXT
+            )
+            """
+        )
+        conn.commit()
+        print("Table 'metrics' created successfully")
+
+    # Retention flags rows whose raw payload was replaced by compact aggregates
+    columns = {row[1] for row in cursor.execute("PRAGMA table_info(metrics)")}
+    if "compacted" not in columns:
+        cursor.execute("ALTER TABLE metrics ADD COLUMN compacted INTEGER NOT NULL DEFAULT 0")
+
+    # Date-range scans, MIN/MAX lookups and the (org, date) dedupe check at ingest
+    # all use this index; ISO dates sort chronologically as text
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_metrics_date_org ON metrics (date, org)")
+
+    # Key/value table holding bookkeeping such as the data generation
+    cursor.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+
+    # Per-day totals maintained at ingest, used by the SQL trend queries
+    pending = []
+    cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='daily_metrics'")
+    if not cursor.fetchone():
+        cursor.execute(
+            """
+            CREATE TABLE daily_metrics (
+                org TEXT NOT NULL,
+                date TEXT NOT NULL,
+                active_users INTEGER NOT NULL,
+                engaged_users INTEGER NOT NULL,
+                lines_suggested INTEGER NOT NULL,
+                lines_accepted INTEGER NOT NULL,
+                PRIMARY KEY (org, date)
+            )
+            """
+        )
+        pending.append("daily_metrics")
+
+    # Team-level payloads, keyed (org, team, date) so the team filter is an index lookup
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS team_metrics (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            org TEXT NOT NULL,
+            team TEXT NOT NULL,
+            date TEXT NOT NULL,
+            data TEXT NOT NULL,
+            UNIQUE (org, team, date)
+        )
+        """
+    )
+
+    # Current seat assignments plus their daily deltas, see utils/seats.py
+    seats.ensure_tables(conn)
+
+    # Typed columnar rows for every metric family, see utils/flatten.py
+    pending += flatten.ensure_tables(conn)
+
+    # New or changed derived tables start empty. Backfilling them decodes every
+    # stored payload, so it is left to the parallel rebuild (utils/rebuild.py)
+    # rather than to whichever session connects first
+    if pending and cursor.execute("SELECT 1 FROM metrics LIMIT 1").fetchone():
+        mark_rebuild_pending(conn, pending)
+    conn.commit()
+
+def mark_rebuild_pending(conn, tables):
+    """Record derived tables that have to be rebuilt, inside the caller's transaction."""
+    conn.executemany(
+        "INSERT OR REPLACE INTO meta (key, value) VALUES (?, '1')",
+        [(f"rebuild_pending:{table}",) for table in tables],
+    )
+
+def get_pending_rebuilds(conn):
+    """Return the derived tables marked by `mark_rebuild_pending` that were not rebuilt yet."""
+    rows = conn.execute("SELECT key FROM meta WHERE key LIKE 'rebuild_pending:%' ORDER BY key").fetchall()
+    return [key.split(":", 1)[1] for (key,) in rows]
+
+# Two scalar subqueries so each bound is a single seek on idx_metrics_date_org
+DATA_RANGE_QUERY = "SELECT (SELECT MIN(date) FROM metrics), (SELECT MAX(date) FROM metrics)"
+
 def get_data_range():
-    """Get the earliest and latest dates from the metrics database."""
+    """Get the earliest and latest dates (`datetime.date`) from the metrics database."""
+    ranges = _fan_out(None, lambda conn, _: conn.execute(DATA_RANGE_QUERY).fetchone())
+    min_dates = [r[0] for r in ranges if r[0]]
+    max_dates = [r[1] for r in ranges if r[1]]
+    return (date.fromisoformat(min(min_dates)) if min_dates else None,
+            date.fromisoformat(max(max_dates)) if max_dates else None)
+
+def get_data_generation():
+    """
+    Get the current data generation.
+
+    The generation is a counter bumped every time new metrics are stored, so it
+    can be used as part of cache keys to detect stale derived data.
+    """
     conn = get_connection()
     cur = conn.cursor()
-    cur.execute("SELECT MIN(date), MAX(date) FROM metrics")
-    min_date, max_date = cur.fetchone()
+    cur.execute("SELECT value FROM meta WHERE key='generation'")
+    row = cur.fetchone()
     conn.close()
-    return min_date, max_date
+    return int(row[0]) if row else 0
 
-# --- Data Loading & Aggregation ---
-def load_metrics(date_range, orgs):
+def get_org_generations(orgs):
+    """
+    Get a generation tuple that changes whenever data of any of `orgs` changes.
+
+    It combines the all-orgs epoch (`generation:*`) with the per-org counters,
+    so cached views of other orgs survive an import that only touched one org.
+    """
+    keys = ["generation:*"] + [f"generation:{org}" for org in sorted(set(orgs))]
+    conn = get_connection()
+    values = dict(conn.execute(
+        f"SELECT key, value FROM meta WHERE key IN ({','.join('?' for _ in keys)})", keys
+    ).fetchall())
+    conn.close()
+    return tuple(int(values.get(key, 0)) for key in keys)
+
+def bump_data_generation(orgs=None):
+    """
+    Increment the data generation, and the generations of `orgs` or of all orgs.
+
+    Call after the new data has been committed so that no reader can cache
+    the old data under the new generation.
+    """
+    keys = ["generation"] + ([f"generation:{org}" for org in orgs] if orgs else ["generation:*"])
     conn = get_connection()
     cur = conn.cursor()
-    query = "SELECT org, date, data FROM metrics WHERE date BETWEEN ? AND ?"
+    cur.executemany(
+        """
+        INSERT INTO meta (key, value) VALUES (?, '1')
+        ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1
+        """,
+        [(key,) for key in keys],
+    )
+    conn.commit()
+    conn.close()
+
+# --- Per-day totals & trends ---
+
+# Days of history needed before the selected range: 27 for the 28-day
+# window of the first day, which also covers the prior 7-day window for WoW
+TREND_LOOKBACK_DAYS = 27
+
+def daily_totals(data):
+    """Return (active, engaged, lines suggested, lines accepted) for one day's payload."""
+    suggested, accepted = record_code_metrics({"data": data}, None, None, None)
+    return (
+        data.get("total_active_users", 0),
+        data.get("total_engaged_users", 0),
+        suggested,
+        accepted,
+    )
+
+def upsert_daily_metrics(conn, org, rec_date, data):
+    """Store the per-day totals of a payload inside the caller's transaction."""
+    conn.execute(
+        """
+        INSERT OR REPLACE INTO daily_metrics
+            (org, date, active_users, engaged_users, lines_suggested, lines_accepted)
+        VALUES (?, ?, ?, ?, ?, ?)
+        """,
+        (org, rec_date, *daily_totals(data)),
+    )
+
+def load_flat_daily(table_name, date_range, orgs, metrics, group_by=(), filters=None):
+    """
+    Daily sums from a flattened metric family table, merged across shards.
+
+    Returns a DataFrame with `date` (datetime), the `group_by` columns and one
+    column per metric.
+    """
+    results = _fan_out(orgs, lambda conn, shard_orgs: flatten.query_daily(
+        conn, table_name, date_range, shard_orgs, metrics, group_by, filters))
+    columns = ["date"] + list(group_by) + list(metrics)
+    rows = [row for shard_rows, _ in results for row in shard_rows]
+    df = pd.DataFrame(rows, columns=columns)
+    if df.empty:
+        return df
+    if sharding.is_sharded():
+        df = df.groupby(["date"] + list(group_by), as_index=False)[list(metrics)].sum()
+    df["date"] = pd.to_datetime(df["date"])
+    return df.sort_values("date").reset_index(drop=True)
+
+def get_trend_metrics(date_range, orgs):
+    """
+    Compute rolling averages and week-over-week deltas per org with SQL window functions.
+
+    Only the selected range plus `TREND_LOOKBACK_DAYS` of history is read from
+    `daily_metrics`. Windows are defined on the calendar (RANGE over the day
+    number), so missing days shorten a window instead of shifting it. WoW
+    deltas compare each day's 7-day value with the one 7 days earlier.
+    """
+    start, end = date_range[0].isoformat(), date_range[1].isoformat()
+    org_filter = ""
+    params = [start, end]
+    if orgs:
+        org_filter = f" AND org IN ({','.join('?' for _ in orgs)})"
+        params.extend(orgs)
+    query = f"""
+        WITH days AS (
+            SELECT org, date, julianday(date) AS jd,
+                   active_users, engaged_users, lines_suggested, lines_accepted
+            FROM daily_metrics
+            WHERE date BETWEEN date(?, '-{TREND_LOOKBACK_DAYS} days') AND ?{org_filter}
+        ),
+        rolled AS (
+            SELECT org, date, jd,
+                   AVG(active_users) OVER w7 AS active_7d,
+                   AVG(active_users) OVER w28 AS active_28d,
+                   AVG(engaged_users) OVER w7 AS engaged_7d,
+                   AVG(engaged_users) OVER w28 AS engaged_28d,
+                   100.0 * SUM(lines_accepted) OVER w7 / NULLIF(SUM(lines_suggested) OVER w7, 0) AS rate_7d,
+                   100.0 * SUM(lines_accepted) OVER w28 / NULLIF(SUM(lines_suggested) OVER w28, 0) AS rate_28d
+            FROM days
+            WINDOW w7 AS (PARTITION BY org ORDER BY jd RANGE BETWEEN 6 PRECEDING AND CURRENT ROW),
+                   w28 AS (PARTITION BY org ORDER BY jd RANGE BETWEEN 27 PRECEDING AND CURRENT ROW)
+        )
+        SELECT cur.org, cur.date,
+               cur.active_7d, cur.active_28d, cur.active_7d - prev.active_7d AS active_wow,
+               cur.engaged_7d, cur.engaged_28d, cur.engaged_7d - prev.engaged_7d AS engaged_wow,
+               cur.rate_7d, cur.rate_28d, cur.rate_7d - prev.rate_7d AS rate_wow
+        FROM rolled cur
+        LEFT JOIN rolled prev ON prev.org = cur.org AND prev.jd = cur.jd - 7
+        WHERE cur.date BETWEEN ? AND ?
+        ORDER BY cur.org, cur.date
+    """
+    params.extend([start, end])
+    frames = _fan_out(orgs, lambda conn, _: pd.read_sql_query(query, conn, params=params))
+    frames = [frame for frame in frames if not frame.empty]
+    if not frames:
+        return pd.DataFrame(columns=["org", "date", "active_7d", "active_28d", "active_wow",
+                                     "engaged_7d", "engaged_28d", "engaged_wow",
+                                     "rate_7d", "rate_28d", "rate_wow"])
+    df = pd.concat(frames, ignore_index=True)
+    df["date"] = pd.to_datetime(df["date"])
+    return df
+
+# --- Data Loading & Aggregation ---
+
+# Rows fetched per round trip when streaming metrics from the database
+METRICS_BATCH_SIZE = 256
+
+def _metrics_query(date_range, orgs, teams=None):
+    # Selecting teams switches from org-level to team-level payloads
+    if teams:
+        query = "SELECT org, date, data FROM team_metrics WHERE date BETWEEN ? AND ?"
+    else:
+        query = "SELECT org, date, data FROM metrics WHERE date BETWEEN ? AND ?"
     params = [date_range[0].isoformat(), date_range[1].isoformat()]
     if orgs:
         placeholders = ",".join("?" for _ in orgs)
         query += f" AND org IN ({placeholders})"
         params.extend(orgs)
-    cur.execute(query, params)
-    rows = cur.fetchall()
-    conn.close()
-    records = []
-    for org, rec_date, data in rows:
-        records.append({"org": org, "date": rec_date, "data": json.loads(data)})
-    return records
+    if teams:
+        placeholders = ",".join("?" for _ in teams)
+        query += f" AND team IN ({placeholders})"
+        params.extend(teams)
+    return query, params
+
+def _iter_rows(conn, date_range, orgs, batch_size=METRICS_BATCH_SIZE, teams=None):
+    cur = conn.cursor()
+    cur.execute(*_metrics_query(date_range, orgs, teams))
+    while True:
+        rows = cur.fetchmany(batch_size)
+        if not rows:
+            break
+        for org, rec_date, data in rows:
+            yield {"org": org, "date": date.fromisoformat(rec_date), "data": json.loads(data)}
+
+def iter_metrics(date_range, orgs, batch_size=METRICS_BATCH_SIZE, teams=None):
+    """
+    Stream decoded metric records for a date range and list of orgs.
+
+    Rows are fetched `batch_size` at a time and decoded lazily, so only one
+    batch of raw JSON blobs is held in memory at any point. The connection is
+    closed once the generator is exhausted or garbage collected. With per-org
+    shards the shards are read one after another. When `teams` is given the
+    team-level payloads of those teams are returned instead, one record per
+    team and day.
+    """
+    if sharding.is_sharded():
+        shard_orgs = [org for org, _ in sharding.list_shards(orgs)]
+    else:
+        shard_orgs = [None]
+    for org in shard_orgs:
+        conn = get_connection(org)
+        try:
+            yield from _iter_rows(conn, date_range, [org] if org is not None else orgs, batch_size, teams)
+        finally:
+            conn.close()
+
+def load_metrics(date_range, orgs, teams=None):
+    results = _fan_out(orgs, lambda conn, shard_orgs: list(
+        _iter_rows(conn, date_range, shard_orgs, teams=teams)))
+    return [record for records in results for record in records]
 
 def get_org_options():
+    if sharding.is_sharded():
+        return sorted(org for org, _ in sharding.list_shards())
     conn = get_connection()
     cur = conn.cursor()
     cur.execute("SELECT DISTINCT org FROM metrics")
@@ -103,6 +432,60 @@ def get_org_options():
     conn.close()
     return orgs
 
+def get_team_options(orgs):
+    """Teams with imported metrics for the selected orgs, read from the `team_metrics` key index."""
+    def teams_of(conn, shard_orgs):
+        query = "SELECT DISTINCT team FROM team_metrics"
+        if shard_orgs:
+            query += f" WHERE org IN ({','.join('?' for _ in shard_orgs)})"
+        return [row[0] for row in conn.execute(query, shard_orgs or [])]
+
+    return sorted({team for teams in _fan_out(orgs, teams_of) for team in teams})
+
+def get_inactive_seats(orgs, days):
+    """Seats without activity in the last `days` days, merged across shards, longest idle first."""
+    results = _fan_out(orgs, lambda conn, shard_orgs: seats.query_inactive(conn, shard_orgs, days))
+    rows = [row for shard_rows, _ in results for row in shard_rows]
+    df = pd.DataFrame(rows, columns=seats.INACTIVE_COLUMNS)
+    if sharding.is_sharded():
+        df = df.sort_values("idle_since", kind="stable").reset_index(drop=True)
+    return df
+
+def load_filter_options(date_range, orgs, teams=None):
+    """Editors, models and languages present in a date range, collected from every shard in parallel."""
+    results = _fan_out(orgs, lambda conn, shard_orgs: get_filter_options(
+        _iter_rows(conn, date_range, shard_orgs, teams=teams)))
+    editors, models, languages = set(), set(), set()
+    for shard_editors, shard_models, shard_languages in results:
+        editors.update(shard_editors)
+        models.update(shard_models)
+        languages.update(shard_languages)
+    return sorted(editors), sorted(models), sorted(languages)
+
+def _raw_metrics_query(date_range=None, orgs=None):
+    conditions, params = [], []
+    if date_range:
+        conditions.append("date BETWEEN ? AND ?")
+        params.extend([date_range[0].isoformat(), date_range[1].isoformat()])
+    if orgs:
+        conditions.append(f"org IN ({','.join('?' for _ in orgs)})")
+        params.extend(orgs)
+    where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+    return f"SELECT date, org, data FROM metrics{where} ORDER BY date DESC", params
+
+def load_raw_metrics(date_range=None, orgs=None):
+    """
+    Return stored `(date, org, data)` rows, newest first, for the database browser.
+
+    Dates are `datetime.date`. With a `date_range` only that range is read, as
+    an index range scan; `orgs` narrows it further.
+    """
+    results = _fan_out(orgs, lambda conn, shard_orgs: conn.execute(
+        *_raw_metrics_query(date_range, shard_orgs)).fetchall())
+    rows = [(date.fromisoformat(rec_date), org, data) for shard_rows in results for rec_date, org, data in shard_rows]
+    rows.sort(key=lambda row: row[0], reverse=True)
+    return rows
+
 def get_filter_options(records):
     editors, models, languages = set(), set(), set()
     for rec in records:
@@ -116,15 +499,24 @@ def get_filter_options(records):
                         languages.add(lang.get("name"))
     return sorted(editors), sorted(models), sorted(languages)
 
-def build_dataframe(records, sel_editors, sel_models, sel_languages):
+def summarize_records(records, sel_editors, sel_models, sel_languages):
+    """
+    Aggregate records in a single pass.
+
+    `records` may be any iterable, including the `iter_metrics` generator;
+    each record is dropped as soon as it has been summarized. Returns the
+    per-record rows used by `build_dataframe` and the per-language totals used
+    by `load_code_metrics`.
+    """
     rows = []
+    language_stats = {}
     for rec in records:
-        dt = datetime.strptime(rec["date"], "%Y-%m-%d").date()
+        dt = rec["date"]
         data = rec["data"]
         active = data.get("total_active_users", 0)
         engaged = data.get("total_engaged_users", 0)
         inactive = active - engaged
-        sug, acc = record_code_metrics(rec, sel_editors, sel_models, sel_languages)
+        sug, acc = record_code_metrics(rec, sel_editors, sel_models, sel_languages, language_stats)
         rate = (acc / sug * 100) if sug else 0
         rows.append({
             "date": dt,
@@ -136,12 +528,24 @@ def build_dataframe(records, sel_editors, sel_models, sel_languages):
             "accepted": acc,
             "acceptance_rate": rate
         })
+    return rows, language_stats
+
+def _rows_to_dataframe(rows):
     df = pd.DataFrame(rows)
     if not df.empty:
         df.sort_values("date", inplace=True)
     return df
 
-def record_code_metrics(record, sel_editors, sel_models, sel_languages):
+def build_dataframe(records, sel_editors, sel_models, sel_languages):
+    rows, _ = summarize_records(records, sel_editors, sel_models, sel_languages)
+    return _rows_to_dataframe(rows)
+
+def record_code_metrics(record, sel_editors, sel_models, sel_languages, language_stats=None):
+    """
+    Sum suggested and accepted lines of a record for the selected filters.
+
+    When `language_stats` is given, per-language totals are accumulated into it.
+    """
     suggested = 0
     accepted = 0
     comp = record["data"].get("copilot_ide_code_completions")
@@ -155,35 +559,17 @@ def record_code_metrics(record, sel_editors, sel_models, sel_languages):
                 for lang in model.get("languages", []):
                     if sel_languages and lang.get("name") not in sel_languages:
                         continue
-                    suggested += lang.get("total_code_lines_suggested", 0)
-                    accepted += lang.get("total_code_lines_accepted", 0)
+                    lang_suggested = lang.get("total_code_lines_suggested", 0)
+                    lang_accepted = lang.get("total_code_lines_accepted", 0)
+                    suggested += lang_suggested
+                    accepted += lang_accepted
+                    if language_stats is not None:
+                        stats = language_stats.setdefault(lang.get("name", "Unknown"), {"suggested": 0, "accepted": 0})
+                        stats["suggested"] += lang_suggested
+                        stats["accepted"] += lang_accepted
     return suggested, accepted
 
-def load_code_metrics(records, sel_editors, sel_models, sel_languages):
-    # Get language data from records
-    language_stats = {}
-    for record in records:
-        completions = record["data"].get("copilot_ide_code_completions", {})
-        if completions and "editors" in completions:
-            for editor in completions["editors"]:
-                if sel_editors and editor.get("name") not in sel_editors:
-                    continue
-                for model in editor.get("models", []):
-                    if sel_models and model.get("name") not in sel_models:
-                        continue
-                    for lang in model.get("languages", []):
-                        if sel_languages and lang.get("name") not in sel_languages:
-                            continue
-                        lang_name = lang.get("name", "Unknown")
-                        suggested = lang.get("total_code_lines_suggested", 0)
-                        accepted = lang.get("total_code_lines_accepted", 0)
-                        
-                        if lang_name not in language_stats:
-                            language_stats[lang_name] = {"suggested": 0, "accepted": 0}
-                        
-                        language_stats[lang_name]["suggested"] += suggested
-                        language_stats[lang_name]["accepted"] += accepted
-
+def _language_frame(language_stats):
     # Create DataFrame for visualization
     data = []
     for lang, stats in language_stats.items():
@@ -196,6 +582,88 @@ def load_code_metrics(records, sel_editors, sel_models, sel_languages):
                 "Accepted Lines": stats["accepted"]
             })
 
-    df = pd.DataFrame(data)
+    df = pd.DataFrame(data, columns=["Language", "Acceptance Rate", "Suggested Lines", "Accepted Lines"])
     df = df.sort_values("Suggested Lines", ascending=False)
-    return df
\ No newline at end of file
+    return df
+
+def load_code_metrics(records, sel_editors, sel_models, sel_languages):
+    _, language_stats = summarize_records(records, sel_editors, sel_models, sel_languages)
+    return _language_frame(language_stats)
+
+def build_chart_frames(records, sel_editors, sel_models, sel_languages):
+    """
+    Build every chart-ready frame used by the metrics dashboard.
+
+    Returns a dict with the per-record frame (`df`), the weekday sums used for
+    the averages (`daily_sums`), the time series frames (`df_time`, `df_code`,
+    `df_rate_combined`) and the per-language stats (`lang_df`). Records are
+    consumed in a single pass, so a streaming iterator from `iter_metrics` is
+    accepted. Frames may be shared between sessions through the chart cache
+    and must not be mutated.
+    """
+    rows, language_stats = summarize_records(records, sel_editors, sel_models, sel_languages)
+    return _frames_from_summary(rows, language_stats)
+
+def aggregate_chart_frames(date_range, orgs, sel_editors, sel_models, sel_languages, teams=None):
+    """
+    Stream and summarize the selected records, then build the chart frames.
+
+    With per-org shards every shard is summarized in its own thread and the
+    per-record rows and language totals are merged afterwards. With `teams`
+    the frames are built from the team-level payloads of those teams.
+    """
+    def summarize(conn, shard_orgs):
+        return summarize_records(_iter_rows(conn, date_range, shard_orgs, teams=teams),
+                                 sel_editors, sel_models, sel_languages)
+
+    rows, language_stats = [], {}
+    for shard_rows, shard_stats in _fan_out(orgs, summarize):
+        rows.extend(shard_rows)
+        for lang, stats in shard_stats.items():
+            merged = language_stats.setdefault(lang, {"suggested": 0, "accepted": 0})
+            merged["suggested"] += stats["suggested"]
+            merged["accepted"] += stats["accepted"]
+    return _frames_from_summary(rows, language_stats)
+
+def _frames_from_summary(rows, language_stats):
+    df = _rows_to_dataframe(rows)
+    if df.empty:
+        return {"df": df}
+
+    df["date"] = pd.to_datetime(df["date"])
+
+    # Weekday averages are computed from per-day sums excluding weekends
+    weekday_df = df[df["date"].dt.weekday < 5]
+    daily_sums = weekday_df.groupby("date")[["active", "engaged", "inactive"]].sum()
+
+    df_time = df.groupby("date")[["active", "engaged", "inactive"]].sum().reset_index()
+    df_code = df.groupby("date")[["suggested", "accepted"]].sum().reset_index()
+
+    # Overall acceptance rate by date
+    df_rate_overall = df.groupby("date").agg({
+        "accepted": "sum",
+        "suggested": "sum"
+    }).reset_index()
+    df_rate_overall["acceptance_rate"] = (df_rate_overall["accepted"] / df_rate_overall["suggested"] * 100)
+    df_rate_overall["org"] = "Overall"
+
+    # Per-org acceptance rate by date
+    df_rate_org = df.groupby(["date", "org"]).agg({
+        "accepted": "sum",
+        "suggested": "sum"
+    }).reset_index()
+    df_rate_org["acceptance_rate"] = (df_rate_org["accepted"] / df_rate_org["suggested"] * 100)
+
+    df_rate_combined = pd.concat([df_rate_overall[["date", "org", "acceptance_rate"]],
+                                  df_rate_org[["date", "org", "acceptance_rate"]]])
+
+    lang_df = _language_frame(language_stats)
+
+    return {
+        "df": df,
+        "daily_sums": daily_sums,
+        "df_time": df_time,
+        "df_code": df_code,
+        "df_rate_combined": df_rate_combined,
+        "lang_df": lang_df,
+    }
\ No newline at end of file
@@ -1,93 +1,327 @@
-import requests
 import json
+import logging
 from dotenv import load_dotenv
 import os
 import streamlit as st
-from utils.helpers import get_connection
+from utils.helpers import get_connection, bump_data_generation, upsert_daily_metrics
+from utils.flatten import store_flattened
+from utils.chart_cache import invalidate, prewarm_default_view
 from utils.auth import get_secret
+import utils.replica as replica
+import utils.sharding as sharding
+from utils.retention import get_retention_days, run_retention
+from utils.rebuild import run_pending_rebuild
+from utils.seats import ingest_seats
+from utils.github_api import GitHubAPIError, api_url, iter_pages
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import requests
+
+DEFAULT_TEAM_FETCH_CONCURRENCY = 8
+
+def team_metrics_enabled():
+    return os.getenv("TEAM_METRICS", "false").strip().lower() in ("1", "true", "yes")
+
+def seat_import_enabled():
+    return os.getenv("SEAT_METRICS", "false").strip().lower() in ("1", "true", "yes")
+
+def configured_orgs():
+    return [org.strip() for org in os.getenv("ORG_LIST", "").split(",") if org.strip()]
+
+class ImportFailed(Exception):
+    """Raised by `run_import` when an import cannot start or its result cannot be published."""
+
+class ImportReporter:
+    """
+    Receives the progress of `run_import`.
+
+    The default implementation only logs and keeps the warnings; the
+    background import records both for the dashboard.
+    """
+
+    def __init__(self):
+        self.warnings = []
+
+    def update(self, org, stage, **details):
+        logging.info(f"Import of {org}: {stage} {details or ''}")
+
+    def warning(self, message):
+        logging.warning(message)
+        self.warnings.append(message)
+
+def fetch_org_metrics(org, token):
+    """
+    Fetch every page of an org's metrics.
+
+    Raises:
+        GitHubAPIError: If a page cannot be fetched.
+    """
+    metrics = []
+    for page in iter_pages(api_url(f"/orgs/{org}/copilot/metrics"), token):
+        metrics.extend(page)
+    return metrics
 
 def import_metrics_for_org(org, token):
-    url = f"https://api.github.com/orgs/{org}/copilot/metrics"
-    headers = {
-        "Accept": "application/vnd.github+json",
-        "Authorization": f"Bearer {token}",
-        "X-GitHub-Api-Version": "2022-11-28"
-    }
+    try:
+        return fetch_org_metrics(org, token)
+    except GitHubAPIError as exc:
+        st.error(f"Error fetching metrics for {org}: {exc.status_code}")
+        return []
+
+def list_teams(org, token):
+    """Return the slugs of every team in an org."""
+    teams = []
+    for page in iter_pages(api_url(f"/orgs/{org}/teams?per_page=100"), token):
+        teams.extend(team["slug"] for team in page)
+    return teams
+
+def fetch_team_metrics(org, team, token):
     metrics = []
-    while url:
-        resp = requests.get(url, headers=headers)
-        if resp.status_code == 200:
-            metrics.extend(resp.json())
-            # Check for pagination
-            if 'Link' in resp.headers:
-                links = resp.headers['Link']
-                next_link = None
-                for link in links.split(','):
-                    if 'rel="next"' in link:
-                        next_link = link[link.find('<') + 1:link.find('>')]
-                        break
-                url = next_link
-            else:
-                url = None
-        else:
-            st.error(f"Error fetching metrics for {org}: {resp.status_code}")
-            break
+    for page in iter_pages(api_url(f"/orgs/{org}/team/{team}/copilot/metrics"), token):
+        metrics.extend(page)
     return metrics
 
+def import_team_metrics_for_org(org, token, max_workers=None):
+    """
+    Discover the teams of an org and import their metrics.
+
+    Teams are fetched concurrently by at most `max_workers` threads
+    (`TEAM_FETCH_CONCURRENCY`, default 8). Results are written from the calling
+    thread as each team completes, so a single writer touches the database
+    and finished teams do not wait for the slowest one. The data generation
+    of the org is bumped once at the end, not once per team, so cached views
+    are not re-keyed over and over while the import runs.
+
+    Returns:
+        A tuple of (teams imported, teams that failed, new team days stored).
+    """
+    max_workers = max_workers or int(os.getenv("TEAM_FETCH_CONCURRENCY", DEFAULT_TEAM_FETCH_CONCURRENCY))
+    teams = list_teams(org, token)
+    imported, failed, inserted = 0, [], 0
+    if not teams:
+        return imported, failed, inserted
+    conn = get_connection(org)
+    try:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(teams))) as pool:
+            futures = {pool.submit(fetch_team_metrics, org, team, token): team for team in teams}
+            for future in as_completed(futures):
+                team = futures[future]
+                try:
+                    inserted += store_team_metrics(conn, org, team, future.result())
+                    imported += 1
+                except (GitHubAPIError, requests.RequestException) as exc:
+                    logging.warning(f"Failed to fetch metrics for team {org}/{team}: {exc}")
+                    failed.append(team)
+    finally:
+        conn.close()
+    if inserted:
+        bump_data_generation([org])
+    return imported, failed, inserted
+
+def import_seats_for_org(org, token):
+    """
+    Stream the Copilot seat assignments of an org into the seat tables.
+
+    Each page is written as soon as it arrives, so memory stays flat however
+    many seats the org has. Returns the counts from `seats.ingest_seats`.
+    """
+    url = api_url(f"/orgs/{org}/copilot/billing/seats?per_page=100")
+    pages = (page.get("seats", []) for page in iter_pages(url, token))
+    conn = get_connection(org)
+    try:
+        stats = ingest_seats(conn, org, pages)
+    finally:
+        conn.close()
+    if stats["added"] or stats["updated"] or stats["removed"]:
+        bump_data_generation([org])
+    return stats
+
+def store_team_metrics(conn, org, team, metrics):
+    """Store the metrics of one team on `conn`; the caller bumps the data generation."""
+    cur = conn.executemany(
+        "INSERT OR IGNORE INTO team_metrics (org, team, date, data) VALUES (?, ?, ?, ?)",
+        [(org, team, metric.get("date"), json.dumps(metric)) for metric in metrics],
+    )
+    inserted = cur.rowcount
+    conn.commit()
+    return inserted
+
 def store_metrics(org, metrics):
-    conn = get_connection()
+    conn = get_connection(org)
     cur = conn.cursor()
+    inserted = 0
     for metric in metrics:
         rec_date = metric.get("date")
         cur.execute("SELECT id FROM metrics WHERE org=? AND date=?", (org, rec_date))
         if not cur.fetchone():
             cur.execute("INSERT INTO metrics (org, date, data) VALUES (?, ?, ?)",
                         (org, rec_date, json.dumps(metric)))
+            upsert_daily_metrics(conn, org, rec_date, metric)
+            store_flattened(conn, org, rec_date, metric)
+            inserted += 1
     conn.commit()
     conn.close()
+    if inserted:
+        bump_data_generation([org])
+    return inserted
 
-def import_metrics() -> None:
+def run_import(reporter=None):
     """
     Imports metrics for all organizations listed in the ORG_LIST environment variable.
     If running on Azure, copies the database file from persistent storage to local storage before import,
     and back to persistent storage after import.
 
+    With REPLICA_MODE=leased only the replica holding the writer lease imports; the
+    lease is checked again before the database is published back to persistent storage.
+
+    Progress and problems that only affect one org or team go to `reporter`.
+    Cached views of the orgs that received new data are invalidated before the
+    default view is prewarmed. Apart from the Key Vault diagnostics of
+    `get_secret`, which only reach a page when called from a script, nothing
+    here touches Streamlit, so this can run outside a script, e.g. on the
+    background import thread. A token that cannot be found in the environment
+    or Key Vault always ends the import with `ImportFailed`.
+
+    Returns:
+        A dict of org -> new rows stored (metric days, team days and seat changes).
+
     Raises:
-        RuntimeError: If the GitHub token is not found.
+        ImportFailed: If the GitHub token is not found, or the database cannot be
+            copied from or published back to persistent storage.
     """
     import shutil
-    import logging
 
-    org_list = [org.strip() for org in os.getenv("ORG_LIST", "").split(",") if org.strip()]
+    reporter = reporter or ImportReporter()
+    org_list = configured_orgs()
     token = os.getenv("GHCP_TOKEN")
     if not token:
         token = get_secret("GHCP_TOKEN")
     if not token:
-        st.error("GitHub token not found in .env file.")
-        st.stop()
+        raise ImportFailed("GitHub token not found in the environment (.env file) or Key Vault; "
+                           "see the server log for Key Vault errors.")
+
+    leased = replica.is_leased_mode()
+    if leased:
+        lease = replica.get_lease()
+        if not lease.try_acquire():
+            holder, _ = lease.current_holder()
+            reporter.warning(f"Import skipped: replica {holder} holds the writer lease.")
+            return {}
 
     local_db_path = os.getenv("DB_NAME")
     persistent_db_path = os.getenv("PERSISTENT_STORAGE")
-    running_on_azure = bool(persistent_db_path and local_db_path and os.path.exists(persistent_db_path))
+    # In leased mode the writer creates the shared file if it does not exist yet
+    # Shards live directly on the mounted volume, so they are never copied
+    running_on_azure = bool(persistent_db_path and local_db_path and not sharding.is_sharded() and
+                            (os.path.exists(persistent_db_path) or leased))
 
     # If running on Azure, copy DB from persistent storage to local
     if running_on_azure and os.path.exists(persistent_db_path):
         try:
-            shutil.copy2(persistent_db_path, local_db_path)
+            # Sessions keep reading the local file during a background import, so swap the copy in atomically
+            tmp_path = f"{local_db_path}.tmp"
+            shutil.copy2(persistent_db_path, tmp_path)
+            os.replace(tmp_path, local_db_path)
             logging.info(f"Copied DB from {persistent_db_path} to {local_db_path}")
         except Exception as exc:
-            st.error(f"Failed to copy DB from persistent storage: {exc}")
-            st.stop()
+            raise ImportFailed(f"Failed to copy DB from persistent storage: {exc}") from exc
 
+    stored = {org: 0 for org in org_list}
     for org in org_list:
-        metrics = import_metrics_for_org(org, token)
-        store_metrics(org, metrics)
+        reporter.update(org, "queued")
+
+    def import_org(org):
+        reporter.update(org, "fetching")
+        try:
+            metrics = fetch_org_metrics(org, token)
+        except (GitHubAPIError, requests.RequestException) as exc:
+            reporter.warning(f"Error fetching metrics for {org}: {getattr(exc, 'status_code', exc)}")
+            reporter.update(org, "failed", error=str(exc))
+            return
+        reporter.update(org, "storing", days=len(metrics))
+        stored[org] += store_metrics(org, metrics)
+
+        # Per-team breakdowns are opt-in since large orgs have hundreds of teams
+        if team_metrics_enabled():
+            reporter.update(org, "teams")
+            try:
+                imported, failed, inserted = import_team_metrics_for_org(org, token)
+                stored[org] += inserted
+                logging.info(f"Imported metrics for {imported} teams of {org}")
+                if failed:
+                    reporter.warning(f"Could not fetch metrics for {len(failed)} teams of {org}")
+            except (GitHubAPIError, requests.RequestException) as exc:
+                reporter.warning(f"Error listing teams for {org}: {getattr(exc, 'status_code', exc)}")
+
+        # Seat assignments need the manage_billing:copilot scope, so they are opt-in too
+        if seat_import_enabled():
+            reporter.update(org, "seats")
+            try:
+                stats = import_seats_for_org(org, token)
+                stored[org] += stats["added"] + stats["updated"] + stats["removed"]
+                logging.info(f"Imported seats of {org}: {stats}")
+            except (GitHubAPIError, requests.RequestException) as exc:
+                reporter.warning(f"Error fetching seats for {org}: {getattr(exc, 'status_code', exc)}")
+        reporter.update(org, "done", rows=stored[org])
+
+    if sharding.is_sharded() and org_list:
+        # Each org writes to its own shard, so orgs are imported in parallel
+        with ThreadPoolExecutor(max_workers=min(sharding.get_shard_workers(), len(org_list))) as pool:
+            list(pool.map(import_org, org_list))
+    else:
+        for org in org_list:
+            import_org(org)
+
+    # Backfill derived tables created or changed since the last import, off the dashboard sessions
+    try:
+        if run_pending_rebuild():
+            logging.info("Rebuilt pending derived tables")
+    except Exception as exc:
+        logging.warning(f"Rebuild of pending derived tables failed: {exc}")
+
+    # Compact old raw payloads so the file copied to persistent storage stays small
+    if get_retention_days() is not None:
+        try:
+            run_retention()
+        except Exception as exc:
+            logging.warning(f"Retention job failed: {exc}")
 
     # After import, copy DB back to persistent storage if on Azure
     if running_on_azure:
+        if leased and not lease.is_held():
+            raise ImportFailed("Writer lease lost during import; the database was not published.")
         try:
-            shutil.copy2(local_db_path, persistent_db_path)
+            # Copy next to the target and swap it in atomically so readers never see a partial file
+            tmp_path = f"{persistent_db_path}.tmp"
+            shutil.copy2(local_db_path, tmp_path)
+            os.replace(tmp_path, persistent_db_path)
             logging.info(f"Copied DB back to {persistent_db_path}")
         except Exception as exc:
-            st.error(f"Failed to copy DB back to persistent storage: {exc}")
-            st.stop()
+            raise ImportFailed(f"Failed to copy DB back to persistent storage: {exc}") from exc
+
+    # Only views that include an org with new data are dropped; the rest stay cached
+    changed = [org for org, rows in stored.items() if rows]
+    if changed:
+        invalidate(changed)
+
+    # Warm the shared chart cache so the first visitor gets the default view instantly
+    try:
+        prewarm_default_view()
+    except Exception as exc:
+        logging.warning(f"Failed to prewarm chart cache: {exc}")
+    return stored
+
+def import_metrics() -> None:
+    """
+    Run `run_import` from a Streamlit script, showing warnings and errors on the page.
+
+    Stops the script if the import fails.
+    """
+    reporter = ImportReporter()
+    try:
+        run_import(reporter)
+    except ImportFailed as exc:
+        st.error(str(exc))
+        st.stop()
+    finally:
+        for message in reporter.warnings:
+            st.warning(message)
@@ -0,0 +1,197 @@
+"""
+Single-writer lease shared by dashboard replicas.
+
+The lease is a row in a small SQLite database on the shared volume. Acquiring
+or renewing it runs inside a `BEGIN IMMEDIATE` transaction, so SQLite's file
+lock guarantees that only one replica can take over an expired lease. The
+holder renews the lease from a heartbeat thread; if it stops (crash, scale-in)
+the lease expires after `ttl` seconds and another replica takes over.
+
+The module has no Streamlit dependency so it can be exercised from several
+local processes:
+    python -m utils.lease /tmp/lease.db --hold 30
+"""
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL_SECONDS = 60
+LEASE_NAME = "writer"
+
+
+def default_holder_id() -> str:
+    """Identify this process: replica hostname, pid and a random suffix."""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class WriterLease:
+    """
+    A lease row with a heartbeat, granting one holder the right to write.
+
+    Args:
+        path: Path of the SQLite file storing the lease row.
+        holder_id: Unique identifier of this process.
+        ttl: Seconds after the last heartbeat before the lease can be taken over.
+    """
+
+    def __init__(self, path: str, holder_id: Optional[str] = None, ttl: float = DEFAULT_TTL_SECONDS) -> None:
+        self.path = path
+        self.holder_id = holder_id or default_holder_id()
+        self.ttl = ttl
+        self._held = False
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._init_table()
+
+    def _connect(self) -> sqlite3.Connection:
+        # Autocommit mode so transactions are controlled explicitly
+        conn = sqlite3.connect(self.path, timeout=self.ttl / 3, isolation_level=None)
+        return conn
+
+    def _init_table(self) -> None:
+        lease_dir = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(lease_dir, exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS writer_lease (
+                    name TEXT PRIMARY KEY,
+                    holder TEXT NOT NULL,
+                    acquired_at REAL NOT NULL,
+                    heartbeat_at REAL NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+                """
+            )
+        finally:
+            conn.close()
+
+    def try_acquire(self) -> bool:
+        """
+        Acquire or renew the lease if it is free, expired or already ours.
+
+        Returns:
+            True if this process holds the lease afterwards.
+        """
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT holder, acquired_at, expires_at FROM writer_lease WHERE name = ?", (LEASE_NAME,)
+            ).fetchone()
+            if row and row[0] != self.holder_id and row[2] > now:
+                conn.execute("ROLLBACK")
+                self._held = False
+                return False
+            acquired_at = row[1] if row and row[0] == self.holder_id else now
+            conn.execute(
+                """
+                INSERT OR REPLACE INTO writer_lease (name, holder, acquired_at, heartbeat_at, expires_at)
+                VALUES (?, ?, ?, ?, ?)
+                """,
+                (LEASE_NAME, self.holder_id, acquired_at, now, now + self.ttl),
+            )
+            conn.execute("COMMIT")
+            if not self._held:
+                logger.info(f"Writer lease acquired by {self.holder_id}")
+            self._held = True
+            return True
+        except sqlite3.OperationalError as exc:
+            # Another process holds the write lock; treat as not acquired this round
+            logger.warning(f"Writer lease check failed: {exc}")
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            self._held = False
+            return False
+        finally:
+            conn.close()
+
+    def release(self) -> None:
+        """Give up the lease if this process holds it."""
+        conn = self._connect()
+        try:
+            conn.execute("DELETE FROM writer_lease WHERE name = ? AND holder = ?", (LEASE_NAME, self.holder_id))
+        finally:
+            conn.close()
+        if self._held:
+            logger.info(f"Writer lease released by {self.holder_id}")
+        self._held = False
+
+    def current_holder(self) -> Tuple[Optional[str], Optional[float]]:
+        """Return the holder and expiry timestamp of the lease, or (None, None) if nobody holds it."""
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT holder, expires_at FROM writer_lease WHERE name = ? AND expires_at > ?",
+                (LEASE_NAME, time.time()),
+            ).fetchone()
+        finally:
+            conn.close()
+        return (row[0], row[1]) if row else (None, None)
+
+    def is_held(self) -> bool:
+        """
+        Check against the lease row that this process is still the holder.
+
+        Use before committing work that must only be done by the writer.
+        """
+        holder, _ = self.current_holder()
+        self._held = holder == self.holder_id
+        return self._held
+
+    @property
+    def held(self) -> bool:
+        """Last known lease state, without touching the database."""
+        return self._held
+
+    def start_heartbeat(self) -> None:
+        """Renew the lease every ttl/3 seconds, or try to take it over when it expires."""
+        if self._thread and self._thread.is_alive():
+            return
+        # First attempt is synchronous so the role is known when this returns
+        self.try_acquire()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._heartbeat, name="writer-lease-heartbeat", daemon=True)
+        self._thread.start()
+
+    def stop_heartbeat(self, release: bool = True) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        if release:
+            self.release()
+
+    def _heartbeat(self) -> None:
+        while not self._stop.wait(self.ttl / 3):
+            self.try_acquire()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(process)d %(message)s")
+    parser = argparse.ArgumentParser(description="Contend for the writer lease from this process.")
+    parser.add_argument("path", help="Lease database path")
+    parser.add_argument("--ttl", type=float, default=6)
+    parser.add_argument("--hold", type=float, default=20, help="Seconds to run the heartbeat before exiting")
+    parser.add_argument("--crash", action="store_true", help="Exit without releasing the lease")
+    args = parser.parse_args()
+
+    lease = WriterLease(args.path, ttl=args.ttl)
+    lease.start_heartbeat()
+    deadline = time.time() + args.hold
+    while time.time() < deadline:
+        print(f"{lease.holder_id} held={lease.held} holder={lease.current_holder()[0]}", flush=True)
+        time.sleep(args.ttl / 2)
+    if args.crash:
+        os._exit(0)
+    lease.stop_heartbeat()
@@ -0,0 +1,63 @@
+"""
+Check that the hot queries are served by indexes.
+
+Each entry of `HOT_QUERIES` builds one of the queries issued by the helpers
+and lists the index its `EXPLAIN QUERY PLAN` must use. A plan step that
+scans a whole table instead fails the check, so a schema or query change that
+silently drops an index lookup is caught before it reaches a large database.
+
+Usage (from `app/src`, exits non-zero on a failed check):
+    python -m utils.query_plans --db data/metrics.db
+"""
+import argparse
+import sys
+from datetime import date
+
+import utils.helpers as helpers
+import utils.seats as seats
+
+_RANGE = (date(2024, 1, 1), date(2024, 1, 31))
+
+# name -> (query and parameters, index every table access must use)
+HOT_QUERIES = {
+    "metrics date range": (helpers._metrics_query(_RANGE, []), "idx_metrics_date_org"),
+    "metrics date range for orgs": (helpers._metrics_query(_RANGE, ["a", "b"]), "idx_metrics_date_org"),
+    "data range banner": ((helpers.DATA_RANGE_QUERY, []), "idx_metrics_date_org"),
+    "ingest dedupe": (("SELECT id FROM metrics WHERE org=? AND date=?", ["a", "2024-01-01"]), "idx_metrics_date_org"),
+    "database browser range": (helpers._raw_metrics_query(_RANGE, ["a"]), "idx_metrics_date_org"),
+    "team metrics": (helpers._metrics_query(_RANGE, ["a"], ["t"]), "sqlite_autoindex_team_metrics_1"),
+    "inactive seats": (seats._inactive_query(["a"], 30), "idx_seats_idle"),
+}
+
+
+def query_plan(conn, query, params):
+    """Return the detail column of every `EXPLAIN QUERY PLAN` step."""
+    return [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {query}", params)]
+
+
+def uses_index(plan, index):
+    """True if every table access of `plan` is a search or covering scan of `index`."""
+    accesses = [step for step in plan if step.startswith(("SCAN", "SEARCH")) and step != "SCAN CONSTANT ROW"]
+    return bool(accesses) and all(f"INDEX {index}" in step for step in accesses)
+
+
+def check(conn):
+    """Run every hot query plan check; return a list of (name, passed, plan)."""
+    results = []
+    for name, ((query, params), index) in HOT_QUERIES.items():
+        plan = query_plan(conn, query, params)
+        results.append((name, uses_index(plan, index), plan))
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default=":memory:", help="Database to check (default: a fresh in-memory schema)")
+    args = parser.parse_args()
+    conn = helpers.open_database(args.db)
+    failed = 0
+    for name, passed, plan in check(conn):
+        print(f"{'ok  ' if passed else 'FAIL'} {name}: {' | '.join(plan)}")
+        failed += not passed
+    conn.close()
+    sys.exit(1 if failed else 0)
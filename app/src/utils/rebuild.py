@@ -0,0 +1,270 @@
+"""
+Parallel rebuild of the data derived from raw metric payloads.
+
+Per-day totals (`daily_metrics`) and the flattened metric family tables are
+written at ingest. When they are added or changed they must be rebuilt from
+every stored `metrics.data` row, and decoding years of JSON on one core is
+slow. This job splits `metrics` into id ranges. A process pool decodes and
+flattens the chunks, and each worker reads its rows itself through a
+read-only connection, so raw payloads are never pickled between processes.
+The derived rows are merged by a single writer in the main process, one
+batched transaction per chunk.
+
+Each chunk is committed together with a checkpoint row. An interrupted
+rebuild therefore resumes with the chunks that are still missing. The
+checkpoints are keyed by the rebuilt tables and the flatten spec, and a
+finished rebuild clears them. Progress and throughput are logged in rows/s.
+
+`helpers.ensure_schema` creates new or changed derived tables empty and marks
+them pending in `meta`. `--pending` backfills only those. Every import runs
+it through `run_pending_rebuild`, so the backfill never happens inside a
+dashboard session.
+
+Usage (from `app/src`):
+    python -m utils.rebuild --workers 8
+    python -m utils.rebuild --tables flat_ide_chat --restart
+    python -m utils.rebuild --pending
+"""
+import json
+import logging
+import os
+import sqlite3
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import utils.flatten as flatten
+import utils.helpers as helpers
+import utils.sharding as sharding
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 2000
+DAILY_TABLE = "daily_metrics"
+DERIVED_TABLES = [DAILY_TABLE] + list(flatten.TABLES)
+
+# Seconds between progress log lines
+PROGRESS_INTERVAL = 5
+
+_worker_conn = None
+
+
+def _init_worker(db_path):
+    global _worker_conn
+    _worker_conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+
+
+def _derive_chunk(start, end, tables):
+    """
+    Decode the metrics rows with `start <= id < end` in a worker process.
+
+    Rows compacted by the retention job only yield the flattened columns
+    their payload still carries (`CompiledTable.compacted_metrics`); these
+    are returned separately to be merged into the existing rows.
+
+    Returns:
+        A tuple of (start, rows read, [(org, date)] of full rows,
+        {table: [row tuples]}, {table: [compacted row tuples]}).
+    """
+    derived = {table: [] for table in tables}
+    merged = {table: [] for table in tables if table in flatten.TABLES and flatten.TABLES[table].compacted_metrics}
+    keys = []
+    rows = _worker_conn.execute(
+        "SELECT org, date, data, compacted FROM metrics WHERE id >= ? AND id < ?", (start, end)
+    ).fetchall()
+    for org, rec_date, data, compacted in rows:
+        payload = json.loads(data)
+        if DAILY_TABLE in derived:
+            derived[DAILY_TABLE].append((org, rec_date, *helpers.daily_totals(payload)))
+        if compacted:
+            for name in merged:
+                flatten.TABLES[name].extract(org, rec_date, payload, merged[name])
+            continue
+        keys.append((org, rec_date))
+        for name, table in flatten.TABLES.items():
+            if name in derived:
+                table.extract(org, rec_date, payload, derived[name])
+    return start, len(rows), keys, derived, merged
+
+
+def ensure_checkpoints(conn):
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS rebuild_checkpoints (
+            target TEXT NOT NULL,
+            chunk_start INTEGER NOT NULL,
+            PRIMARY KEY (target, chunk_start)
+        )
+        """
+    )
+    conn.commit()
+
+
+def checkpoint_target(tables, chunk_size):
+    """Identify a rebuild so checkpoints are only reused by the same one."""
+    return f"{','.join(sorted(tables))}:{flatten.SPEC_VERSION}:{chunk_size}"
+
+
+def _write_chunk(conn, target, start, keys, derived, merged):
+    """Replace the derived rows of one chunk and record its checkpoint in the same transaction."""
+    for name, rows in derived.items():
+        if name == DAILY_TABLE:
+            conn.executemany(
+                "INSERT OR REPLACE INTO daily_metrics "
+                "(org, date, active_users, engaged_users, lines_suggested, lines_accepted) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+        else:
+            table = flatten.TABLES[name]
+            conn.executemany(table.delete_sql, keys)
+            conn.executemany(table.insert_sql, rows)
+            if merged.get(name):
+                conn.executemany(table.merge_compacted_sql, merged[name])
+    conn.execute("INSERT OR IGNORE INTO rebuild_checkpoints (target, chunk_start) VALUES (?, ?)", (target, start))
+    conn.commit()
+
+
+def rebuild_database(conn, tables=None, workers=None, chunk_size=DEFAULT_CHUNK_SIZE, restart=False, pending=False):
+    """
+    Rebuild `tables` (default: all derived tables) of one open database.
+
+    With `pending`, only the tables marked pending by `helpers.ensure_schema`
+    are rebuilt, and nothing if there are none.
+
+    Returns:
+        A tuple of (rows processed, seconds taken).
+    """
+    if pending:
+        tables = helpers.get_pending_rebuilds(conn)
+        if not tables:
+            return 0, 0.0
+    tables = list(tables or DERIVED_TABLES)
+    unknown = [table for table in tables if table not in DERIVED_TABLES]
+    if unknown:
+        raise ValueError(f"Unknown derived tables: {unknown}")
+    db_path = conn.execute("PRAGMA database_list").fetchone()[2]
+    if not db_path:
+        raise ValueError("Rebuild needs a database file; in-memory databases cannot be shared with workers")
+
+    ensure_checkpoints(conn)
+    target = checkpoint_target(tables, chunk_size)
+    if restart:
+        conn.execute("DELETE FROM rebuild_checkpoints WHERE target = ?", (target,))
+        conn.commit()
+    done = {row[0] for row in conn.execute(
+        "SELECT chunk_start FROM rebuild_checkpoints WHERE target = ?", (target,))}
+    low, high = conn.execute("SELECT MIN(id), MAX(id) FROM metrics").fetchone()
+    chunks = [] if low is None else [
+        start for start in range(low, high + 1, chunk_size) if start not in done
+    ]
+    if done:
+        logger.info(f"Resuming rebuild of {db_path}: {len(done)} chunks already done, {len(chunks)} left")
+
+    workers = workers or os.cpu_count() or 1
+    processed, started, last_report = 0, time.monotonic(), time.monotonic()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(db_path,)) as pool:
+        in_flight = set()
+        queue = iter(chunks)
+        while True:
+            # Keep a bounded number of chunks in flight so results never pile up in memory
+            for start in queue:
+                in_flight.add(pool.submit(_derive_chunk, start, start + chunk_size, tables))
+                if len(in_flight) >= workers * 2:
+                    break
+            if not in_flight:
+                break
+            finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                start, rows, keys, derived, merged = future.result()
+                _write_chunk(conn, target, start, keys, derived, merged)
+                processed += rows
+            now = time.monotonic()
+            if now - last_report >= PROGRESS_INTERVAL:
+                logger.info(f"Rebuilt {processed} rows ({processed / (now - started):.0f} rows/s)")
+                last_report = now
+
+    elapsed = time.monotonic() - started
+    conn.execute("DELETE FROM rebuild_checkpoints WHERE target = ?", (target,))
+    conn.executemany("DELETE FROM meta WHERE key = ?", [(f"rebuild_pending:{table}",) for table in tables])
+    conn.commit()
+    logger.info(f"Rebuilt {processed} rows of {db_path} in {elapsed:.1f}s "
+                f"({processed / elapsed if elapsed else 0:.0f} rows/s)")
+    return processed, elapsed
+
+
+def _databases():
+    return [org for org, _ in sharding.list_shards()] if sharding.is_sharded() else [None]
+
+
+def run_rebuild(tables=None, workers=None, chunk_size=DEFAULT_CHUNK_SIZE, restart=False, pending=False):
+    """
+    Rebuild the derived tables of every metrics database (each shard in the sharded layout).
+
+    Returns:
+        A tuple of (rows processed, seconds taken).
+    """
+    total_rows, total_seconds = 0, 0.0
+    for org in _databases():
+        conn = helpers.get_connection(org)
+        try:
+            rows, seconds = rebuild_database(conn, tables, workers, chunk_size, restart, pending)
+        finally:
+            conn.close()
+        total_rows += rows
+        total_seconds += seconds
+    if total_rows:
+        helpers.bump_data_generation()
+    return total_rows, total_seconds
+
+
+def run_pending_rebuild():
+    """
+    Backfill the tables marked pending in every metrics database, each in a child process.
+
+    Imports call this from a thread of the Streamlit server, which must not
+    fork a process pool itself. The child is given the database file, since
+    only this process holds the writer lease in `REPLICA_MODE=leased`.
+
+    Returns:
+        True if any table was rebuilt.
+    """
+    src_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [src_dir, os.getenv("PYTHONPATH")])))
+    rebuilt = False
+    for org in _databases():
+        conn = helpers.get_connection(org)
+        try:
+            pending = helpers.get_pending_rebuilds(conn)
+            db_path = conn.execute("PRAGMA database_list").fetchone()[2]
+        finally:
+            conn.close()
+        if pending:
+            logger.info(f"Rebuilding pending tables {pending} of {db_path}")
+            subprocess.run([sys.executable, "-m", "utils.rebuild", "--pending", "--db", db_path], env=env, check=True)
+            rebuilt = True
+    if rebuilt:
+        helpers.bump_data_generation()
+    return rebuilt
+
+
+if __name__ == "__main__":
+    import argparse
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tables", nargs="+", choices=DERIVED_TABLES, help="Tables to rebuild (default: all)")
+    parser.add_argument("--workers", type=int, help="Worker processes (default: CPU count)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Metrics ids per chunk")
+    parser.add_argument("--restart", action="store_true", help="Ignore checkpoints of an interrupted rebuild")
+    parser.add_argument("--pending", action="store_true", help="Only rebuild tables marked pending (new or changed)")
+    parser.add_argument("--db", help="Rebuild only this database file and leave the data generation to the caller")
+    args = parser.parse_args()
+    if args.db:
+        conn = helpers.open_database(args.db)
+        rows, seconds = rebuild_database(conn, args.tables, args.workers, args.chunk_size, args.restart, args.pending)
+        conn.close()
+    else:
+        rows, seconds = run_rebuild(args.tables, args.workers, args.chunk_size, args.restart, args.pending)
+    print(f"Rebuilt {rows} rows in {seconds:.1f}s ({rows / seconds if seconds else 0:.0f} rows/s)")
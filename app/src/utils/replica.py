@@ -0,0 +1,131 @@
+"""
+Replica roles for horizontally scaled deployments.
+
+With `REPLICA_MODE=leased`, every replica contends for the writer lease
+(`utils/lease.py`) stored next to `PERSISTENT_STORAGE`. The holder is the only
+replica allowed to run imports and publish the database back to the shared
+volume. All other replicas serve sessions from a local snapshot of the shared
+database opened read-only with `query_only`; the snapshot is refreshed when
+the data generation of the shared file changes.
+
+The default `standalone` mode keeps the original single-replica behaviour.
+"""
+import atexit
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from utils.lease import WriterLease, DEFAULT_TTL_SECONDS
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SNAPSHOT_REFRESH_SECONDS = 30
+
+_lease = None
+_lease_lock = threading.Lock()
+_snapshot_lock = threading.Lock()
+_last_snapshot_check = 0.0
+
+
+def is_leased_mode():
+    return os.getenv("REPLICA_MODE", "standalone").strip().lower() == "leased"
+
+
+def get_lease():
+    """
+    Return the process-wide writer lease, starting its heartbeat on first use.
+
+    Raises:
+        RuntimeError: If leased mode is used without `PERSISTENT_STORAGE`.
+    """
+    global _lease
+    with _lease_lock:
+        if _lease is None:
+            persistent_db_path = os.getenv("PERSISTENT_STORAGE")
+            if not persistent_db_path:
+                raise RuntimeError("REPLICA_MODE=leased requires PERSISTENT_STORAGE to be set")
+            lease_path = os.getenv(
+                "LEASE_DB", os.path.join(os.path.dirname(os.path.abspath(persistent_db_path)), "writer_lease.db")
+            )
+            ttl = float(os.getenv("LEASE_TTL_SECONDS", DEFAULT_TTL_SECONDS))
+            _lease = WriterLease(lease_path, ttl=ttl)
+            _lease.start_heartbeat()
+            # Hand over immediately on clean shutdown instead of waiting for expiry
+            atexit.register(_lease.stop_heartbeat)
+        return _lease
+
+
+def is_writer():
+    """True if this replica may write: always in standalone mode, otherwise while holding the lease."""
+    return not is_leased_mode() or get_lease().held
+
+
+def is_read_only_replica():
+    return is_leased_mode() and not get_lease().held
+
+
+def read_generation(db_path):
+    """Read the data generation of a database file without locking it for writes."""
+    if not os.path.exists(db_path):
+        return None
+    conn = sqlite3.connect(Path(db_path).resolve().as_uri() + "?mode=ro", uri=True)
+    try:
+        row = conn.execute("SELECT value FROM meta WHERE key='generation'").fetchone()
+        return int(row[0]) if row else 0
+    except sqlite3.OperationalError:
+        # Older files without the meta table
+        return 0
+    finally:
+        conn.close()
+
+
+def refresh_snapshot(local_db_path, force=False, prepare=None):
+    """
+    Copy the shared database over the local snapshot when its generation changed.
+
+    Checks are throttled to one per `SNAPSHOT_REFRESH_SECONDS`. The copy is
+    written to a temporary file and swapped in with `os.replace`, so open
+    connections keep reading the previous snapshot until they are closed.
+    `prepare(path)` runs on the temporary copy before the swap, e.g. to add
+    tables missing from a shared file written by an older version; the copy
+    is private to this replica, so the shared file is never written.
+
+    Returns:
+        True if a local snapshot exists afterwards.
+    """
+    global _last_snapshot_check
+    persistent_db_path = os.getenv("PERSISTENT_STORAGE")
+    interval = float(os.getenv("SNAPSHOT_REFRESH_SECONDS", DEFAULT_SNAPSHOT_REFRESH_SECONDS))
+    with _snapshot_lock:
+        now = time.time()
+        snapshot_exists = os.path.exists(local_db_path)
+        if snapshot_exists and not force and now - _last_snapshot_check < interval:
+            return True
+        _last_snapshot_check = now
+        if not persistent_db_path or not os.path.exists(persistent_db_path):
+            return snapshot_exists
+        try:
+            shared_generation = read_generation(persistent_db_path)
+            if snapshot_exists and shared_generation == read_generation(local_db_path):
+                return True
+            tmp_path = f"{local_db_path}.tmp"
+            shutil.copy2(persistent_db_path, tmp_path)
+            if prepare:
+                prepare(tmp_path)
+            os.replace(tmp_path, local_db_path)
+            logger.info(f"Refreshed read-only snapshot to generation {shared_generation}")
+        except (OSError, sqlite3.Error) as exc:
+            # Keep serving the previous snapshot; the next check retries
+            logger.warning(f"Failed to refresh read-only snapshot: {exc}")
+        return os.path.exists(local_db_path)
+
+
+def open_read_only(db_path):
+    """Open a read-only connection that also rejects writes at the SQL level."""
+    conn = sqlite3.connect(Path(db_path).resolve().as_uri() + "?mode=ro", uri=True, check_same_thread=False)
+    conn.execute("PRAGMA query_only = ON")
+    return conn
@@ -0,0 +1,195 @@
+"""
+Retention job for raw metric payloads.
+
+Rows older than `RETENTION_DAYS` keep only the aggregates the dashboard reads
+(daily totals and suggested/accepted lines per editor, model and language);
+the rest of the raw payload is dropped. Before a row is compacted its raw
+payload can be appended to a gzip-compressed JSON Lines archive, one file per
+org and month under `RETENTION_ARCHIVE_DIR`. Freed pages are then returned to
+the file system with `PRAGMA incremental_vacuum` in small steps, so the
+database is never locked for long.
+
+The job runs at the end of every import when `RETENTION_DAYS` is set, and can
+be started manually (from `app/src`):
+    python -m utils.retention --days 90 --archive-dir data/archive
+"""
+import gzip
+import json
+import logging
+import os
+import time
+from datetime import date, timedelta
+
+import utils.flatten as flatten
+import utils.helpers as helpers
+import utils.sharding as sharding
+
+logger = logging.getLogger(__name__)
+
+COMPACT_BATCH_SIZE = 200
+DEFAULT_VACUUM_PAGES = 512
+DEFAULT_VACUUM_PAUSE = 0.05
+
+# Fields kept for each language when compacting code completion metrics
+LANGUAGE_FIELDS = flatten.COMPACTED_FIELDS["copilot_ide_code_completions"]
+
+
+def get_retention_days():
+    value = os.getenv("RETENTION_DAYS")
+    return int(value) if value else None
+
+
+def compact_payload(data):
+    """Reduce a raw daily payload to the aggregates used by the dashboard helpers."""
+    compact = {
+        "date": data.get("date"),
+        "total_active_users": data.get("total_active_users", 0),
+        "total_engaged_users": data.get("total_engaged_users", 0),
+    }
+    comp = data.get("copilot_ide_code_completions")
+    if comp:
+        compact["copilot_ide_code_completions"] = {
+            "editors": [
+                {
+                    "name": editor.get("name"),
+                    "models": [
+                        {
+                            "name": model.get("name"),
+                            "languages": [
+                                {"name": lang.get("name"), **{f: lang.get(f, 0) for f in LANGUAGE_FIELDS}}
+                                for lang in model.get("languages", [])
+                            ],
+                        }
+                        for model in editor.get("models", [])
+                    ],
+                }
+                for editor in comp.get("editors", [])
+            ]
+        }
+    return compact
+
+
+def _archive(archive_dir, rows):
+    """Append raw rows to `<archive_dir>/<org>/<YYYY-MM>.jsonl.gz`, one gzip member per batch."""
+    by_file = {}
+    for org, rec_date, data in rows:
+        path = os.path.join(archive_dir, sharding.safe_name(org), f"{rec_date[:7]}.jsonl.gz")
+        by_file.setdefault(path, []).append(json.dumps({"org": org, "date": rec_date, "data": json.loads(data)}))
+    for path, lines in by_file.items():
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with gzip.open(path, "at", encoding="utf-8") as archive:
+            archive.write("\n".join(lines) + "\n")
+            archive.flush()
+            os.fsync(archive.fileno())
+
+
+def compact_old_rows(conn, cutoff, archive_dir=None):
+    """
+    Compact every row dated before `cutoff`, archiving raw payloads first when `archive_dir` is set.
+
+    Each batch is archived, then rewritten and committed in its own short
+    transaction. A crash between both steps only duplicates archive lines,
+    which are keyed by org and date.
+
+    Returns:
+        The number of rows compacted.
+    """
+    compacted = 0
+    while True:
+        rows = conn.execute(
+            "SELECT id, org, date, data FROM metrics WHERE compacted = 0 AND date < ? ORDER BY id LIMIT ?",
+            (cutoff.isoformat(), COMPACT_BATCH_SIZE),
+        ).fetchall()
+        if not rows:
+            return compacted
+        if archive_dir:
+            _archive(archive_dir, [(org, rec_date, data) for _, org, rec_date, data in rows])
+        conn.executemany(
+            "UPDATE metrics SET data = ?, compacted = 1 WHERE id = ?",
+            [(json.dumps(compact_payload(json.loads(data)), separators=(",", ":")), row_id)
+             for row_id, _, _, data in rows],
+        )
+        conn.commit()
+        compacted += len(rows)
+
+
+def incremental_vacuum(conn, pages=DEFAULT_VACUUM_PAGES, pause=DEFAULT_VACUUM_PAUSE):
+    """
+    Release free pages `pages` at a time, pausing between steps so readers get the lock.
+
+    Databases created before incremental auto-vacuum was enabled need a single
+    full `VACUUM` first (see `--enable-incremental`); for those this is a no-op.
+
+    Returns:
+        The number of pages released.
+    """
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        logger.warning("auto_vacuum is not INCREMENTAL; run the retention job with --enable-incremental once")
+        return 0
+    released = 0
+    while True:
+        free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if not free:
+            return released
+        # The pragma frees one page per step, so it has to be run to completion
+        conn.execute(f"PRAGMA incremental_vacuum({int(pages)})").fetchall()
+        conn.commit()
+        step = free - conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if step <= 0:
+            return released
+        released += step
+        time.sleep(pause)
+
+
+def enable_incremental_vacuum(conn):
+    """One-off switch of an existing database to incremental auto-vacuum; rewrites the whole file."""
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+        return
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("VACUUM")
+
+
+def run_retention(days=None, archive_dir=None, pages=DEFAULT_VACUUM_PAGES, pause=DEFAULT_VACUUM_PAUSE,
+                  enable_incremental=False):
+    """
+    Compact, archive and vacuum every metrics database (each shard in the sharded layout).
+
+    Returns:
+        A tuple of (rows compacted, pages released).
+    """
+    days = days if days is not None else get_retention_days()
+    if days is None:
+        raise ValueError("Retention days not configured; set RETENTION_DAYS or pass days")
+    archive_dir = archive_dir if archive_dir is not None else os.getenv("RETENTION_ARCHIVE_DIR")
+    cutoff = date.today() - timedelta(days=days)
+
+    orgs = [org for org, _ in sharding.list_shards()] if sharding.is_sharded() else [None]
+    total_rows, total_pages = 0, 0
+    for org in orgs:
+        conn = helpers.get_connection(org)
+        try:
+            total_rows += compact_old_rows(conn, cutoff, archive_dir)
+            if enable_incremental:
+                enable_incremental_vacuum(conn)
+            total_pages += incremental_vacuum(conn, pages, pause)
+        finally:
+            conn.close()
+    logger.info(f"Retention compacted {total_rows} rows before {cutoff} and released {total_pages} pages")
+    return total_rows, total_pages
+
+
+if __name__ == "__main__":
+    import argparse
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, help="Keep raw payloads for this many days (default RETENTION_DAYS)")
+    parser.add_argument("--archive-dir", help="Archive raw payloads here before compacting (default RETENTION_ARCHIVE_DIR)")
+    parser.add_argument("--vacuum-pages", type=int, default=DEFAULT_VACUUM_PAGES, help="Pages released per step")
+    parser.add_argument("--vacuum-pause", type=float, default=DEFAULT_VACUUM_PAUSE, help="Seconds between steps")
+    parser.add_argument("--enable-incremental", action="store_true",
+                        help="Switch an existing database to incremental auto-vacuum (runs a full VACUUM once)")
+    args = parser.parse_args()
+    rows, pages = run_retention(args.days, args.archive_dir, args.vacuum_pages, args.vacuum_pause,
+                                args.enable_incremental)
+    print(f"Compacted {rows} rows, released {pages} pages")
@@ -0,0 +1,209 @@
+"""
+Copilot seat assignments, ingested as a stream of API pages.
+
+`seats` holds the current state of every assigned seat with its last
+activity. Each import compares a page of seats against the stored rows and
+writes only what changed, and every change is also appended to
+`seat_changes` keyed by the import day. The daily snapshots are therefore
+stored as deltas: a seat that did nothing since yesterday costs no row, and
+`snapshot` replays the deltas to rebuild the seats of any past day.
+
+Pages are written with batched inserts as they arrive. The logins seen so
+far are tracked in a temporary table instead of memory, so seats missing
+from the final list can be marked removed without buffering the full list.
+
+`idle_since` is the last activity, or the assignment time for seats never
+used, in UTC. It is indexed per org, so finding seats inactive for N days
+is a single index range scan.
+"""
+from datetime import date, datetime, timedelta, timezone
+
+# Columns compared between imports; a difference in any of them is a change
+SEAT_COLUMNS = [
+    "created_at",
+    "last_activity_at",
+    "last_activity_editor",
+    "assigning_team",
+    "plan_type",
+    "pending_cancellation_date",
+]
+
+INACTIVE_COLUMNS = ["org", "login", "idle_since", "last_activity_at", "last_activity_editor", "assigning_team"]
+
+SEATS_DDL = f"""
+CREATE TABLE IF NOT EXISTS seats (
+    org TEXT NOT NULL,
+    login TEXT NOT NULL,
+    {', '.join(f'{column} TEXT' for column in SEAT_COLUMNS)},
+    idle_since TEXT NOT NULL,
+    PRIMARY KEY (org, login)
+) WITHOUT ROWID
+"""
+
+SEAT_CHANGES_DDL = f"""
+CREATE TABLE IF NOT EXISTS seat_changes (
+    org TEXT NOT NULL,
+    login TEXT NOT NULL,
+    date TEXT NOT NULL,
+    change TEXT NOT NULL,
+    {', '.join(f'{column} TEXT' for column in SEAT_COLUMNS)},
+    PRIMARY KEY (org, login, date)
+) WITHOUT ROWID
+"""
+
+_UPSERT_SEAT = (
+    f"INSERT INTO seats (org, login, {', '.join(SEAT_COLUMNS)}, idle_since) "
+    f"VALUES (?, ?, {', '.join('?' for _ in SEAT_COLUMNS)}, ?) "
+    f"ON CONFLICT (org, login) DO UPDATE SET "
+    f"{', '.join(f'{column} = excluded.{column}' for column in SEAT_COLUMNS + ['idle_since'])}"
+)
+
+# A seat added and then updated on the same day is still an addition
+_RECORD_CHANGE = (
+    f"INSERT INTO seat_changes (org, login, date, change, {', '.join(SEAT_COLUMNS)}) "
+    f"VALUES (?, ?, ?, ?, {', '.join('?' for _ in SEAT_COLUMNS)}) "
+    f"ON CONFLICT (org, login, date) DO UPDATE SET "
+    f"change = CASE WHEN seat_changes.change = 'added' AND excluded.change = 'updated' "
+    f"THEN 'added' ELSE excluded.change END, "
+    f"{', '.join(f'{column} = excluded.{column}' for column in SEAT_COLUMNS)}"
+)
+
+
+def ensure_tables(conn):
+    conn.execute(SEATS_DDL)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_seats_idle ON seats (org, idle_since)")
+    conn.execute(SEAT_CHANGES_DDL)
+
+
+def _utc(timestamp):
+    """Normalize an ISO 8601 timestamp to `YYYY-MM-DDTHH:MM:SSZ` so strings compare in time order."""
+    if not timestamp:
+        return None
+    parsed = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def seat_row(seat):
+    """Return (login, column values) of a seat from the API, or None if it has no assignee login."""
+    login = (seat.get("assignee") or {}).get("login")
+    if not login:
+        return None
+    return login, (
+        _utc(seat.get("created_at")),
+        _utc(seat.get("last_activity_at")),
+        seat.get("last_activity_editor"),
+        (seat.get("assigning_team") or {}).get("slug"),
+        seat.get("plan_type"),
+        seat.get("pending_cancellation_date"),
+    )
+
+
+def _store_page(conn, org, day, rows):
+    """Write the changed seats of one page; return (added, updated)."""
+    conn.executemany("INSERT OR IGNORE INTO temp.seen_seats (login) VALUES (?)", [(login,) for login, _ in rows])
+    placeholders = ",".join("?" for _ in rows)
+    existing = {
+        row[0]: tuple(row[1:])
+        for row in conn.execute(
+            f"SELECT login, {', '.join(SEAT_COLUMNS)} FROM seats WHERE org = ? AND login IN ({placeholders})",
+            [org] + [login for login, _ in rows],
+        )
+    }
+    upserts, changes = [], []
+    for login, values in rows:
+        if existing.get(login) == values:
+            continue
+        idle_since = values[1] or values[0] or ""
+        upserts.append((org, login, *values, idle_since))
+        changes.append((org, login, day, "updated" if login in existing else "added", *values))
+    conn.executemany(_UPSERT_SEAT, upserts)
+    conn.executemany(_RECORD_CHANGE, changes)
+    added = sum(1 for change in changes if change[3] == "added")
+    return added, len(changes) - added
+
+
+def ingest_seats(conn, org, pages, day=None):
+    """
+    Stream pages of seats (lists of API seat objects) into the seat tables.
+
+    Everything is written in one transaction that is committed only after the
+    last page, so a failed fetch leaves yesterday's state untouched. Seats
+    that were stored but not seen in any page are recorded as removed.
+
+    Returns:
+        A dict with the number of seats seen, added, updated and removed.
+    """
+    day = (day or date.today()).isoformat()
+    stats = {"seen": 0, "added": 0, "updated": 0, "removed": 0}
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS seen_seats (login TEXT PRIMARY KEY)")
+    conn.execute("DELETE FROM temp.seen_seats")
+    try:
+        for page in pages:
+            rows = [row for row in map(seat_row, page) if row is not None]
+            if not rows:
+                continue
+            added, updated = _store_page(conn, org, day, rows)
+            stats["seen"] += len(rows)
+            stats["added"] += added
+            stats["updated"] += updated
+
+        removed = [row[0] for row in conn.execute(
+            "SELECT login FROM seats WHERE org = ? AND login NOT IN (SELECT login FROM temp.seen_seats)", (org,)
+        )]
+        conn.executemany(
+            f"INSERT INTO seat_changes (org, login, date, change) VALUES (?, ?, ?, 'removed') "
+            f"ON CONFLICT (org, login, date) DO UPDATE SET change = 'removed', "
+            f"{', '.join(f'{column} = NULL' for column in SEAT_COLUMNS)}",
+            [(org, login, day) for login in removed],
+        )
+        conn.executemany("DELETE FROM seats WHERE org = ? AND login = ?", [(org, login) for login in removed])
+        stats["removed"] = len(removed)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return stats
+
+
+def inactive_cutoff(days, as_of=None):
+    """UTC timestamp before which a seat counts as inactive for `days` days."""
+    now = as_of or datetime.now(timezone.utc)
+    return (now - timedelta(days=days)).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _inactive_query(orgs, days, as_of=None):
+    query = f"SELECT {', '.join(INACTIVE_COLUMNS)} FROM seats WHERE idle_since < ?"
+    params = [inactive_cutoff(days, as_of)]
+    if orgs:
+        query += f" AND org IN ({','.join('?' for _ in orgs)})"
+        params.extend(orgs)
+    query += " ORDER BY idle_since"
+    return query, params
+
+
+def query_inactive(conn, orgs, days, as_of=None):
+    """
+    Seats with no activity (and no new assignment) in the last `days` days,
+    longest idle first. Served by the `(org, idle_since)` index.
+    """
+    query, params = _inactive_query(orgs, days, as_of)
+    return conn.execute(query, params).fetchall(), INACTIVE_COLUMNS
+
+
+def snapshot(conn, org, day):
+    """Rebuild the seats of `org` as they were after the import of `day` from the stored deltas."""
+    columns = ["login", "change_date"] + SEAT_COLUMNS
+    rows = conn.execute(
+        f"""
+        SELECT login, date, {', '.join(SEAT_COLUMNS)}
+        FROM seat_changes AS c
+        WHERE org = ? AND change != 'removed'
+          AND date = (SELECT MAX(date) FROM seat_changes
+                      WHERE org = c.org AND login = c.login AND date <= ?)
+        ORDER BY login
+        """,
+        (org, day.isoformat()),
+    ).fetchall()
+    return rows, columns
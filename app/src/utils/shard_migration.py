@@ -0,0 +1,181 @@
+"""
+Migrate metrics between the single-file and the per-org sharded layout.
+
+Rows (including team metrics and seats) are copied in batches and skipped when they
+already exist in the destination, so a migration can be re-run safely. Derived
+tables are copied too, since payloads compacted by the retention job cannot be
+flattened again; those the source lacks are marked for a rebuild. The data
+generation of the destination is bumped past the source's so caches built on
+the old layout are not reused.
+
+Usage (from `app/src`):
+    python -m utils.shard_migration to-sharded --db data/metrics.db --shard-dir data/shards
+    python -m utils.shard_migration to-single --shard-dir data/shards --db data/metrics.db
+"""
+import argparse
+import sqlite3
+
+import utils.flatten as flatten
+import utils.helpers as helpers
+import utils.seats as seats
+import utils.sharding as sharding
+
+BATCH_SIZE = 500
+
+
+def _read_generation(conn):
+    try:
+        row = conn.execute("SELECT value FROM meta WHERE key='generation'").fetchone()
+    except sqlite3.OperationalError:
+        return 0
+    return int(row[0]) if row else 0
+
+
+def _set_generation(conn, generation):
+    conn.execute(
+        "INSERT INTO meta (key, value) VALUES ('generation', ?) "
+        "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+        (str(generation),),
+    )
+    conn.commit()
+
+
+def _copy_rows(source, dest, org=None):
+    """Copy metrics rows (optionally of one org) from `source` to `dest`; return the number inserted."""
+    # Sources from before retention have no compacted column
+    columns = {row[1] for row in source.execute("PRAGMA table_info(metrics)")}
+    query = f"SELECT org, date, data, {'compacted' if 'compacted' in columns else '0'} FROM metrics"
+    params = []
+    if org is not None:
+        query += " WHERE org = ?"
+        params.append(org)
+    cur = source.execute(query + " ORDER BY id", params)
+    inserted = 0
+    while True:
+        rows = cur.fetchmany(BATCH_SIZE)
+        if not rows:
+            break
+        for row_org, rec_date, data, compacted in rows:
+            exists = dest.execute("SELECT 1 FROM metrics WHERE org=? AND date=?", (row_org, rec_date)).fetchone()
+            if not exists:
+                dest.execute("INSERT INTO metrics (org, date, data, compacted) VALUES (?, ?, ?, ?)",
+                             (row_org, rec_date, data, compacted))
+                inserted += 1
+        dest.commit()
+    return inserted
+
+
+# Tables keyed by more than (org, date), copied with INSERT OR IGNORE on their unique key
+KEYED_TABLES = {
+    "team_metrics": ["org", "team", "date", "data"],
+    "seats": ["org", "login"] + seats.SEAT_COLUMNS + ["idle_since"],
+    "seat_changes": ["org", "login", "date", "change"] + seats.SEAT_COLUMNS,
+}
+
+
+def _copy_table(source, dest, table, columns, org=None):
+    """
+    Copy `columns` of a table (optionally of one org) with INSERT OR IGNORE.
+
+    Returns:
+        The number of rows inserted, or None if the source lacks the table or a column.
+    """
+    column_list = ", ".join(columns)
+    query = f"SELECT {column_list} FROM {table}"
+    params = []
+    if org is not None:
+        query += " WHERE org = ?"
+        params.append(org)
+    try:
+        cur = source.execute(query, params)
+    except sqlite3.OperationalError:
+        return None  # source predates this table or column
+    insert = f"INSERT OR IGNORE INTO {table} ({column_list}) VALUES ({', '.join('?' for _ in columns)})"
+    inserted = 0
+    while True:
+        rows = cur.fetchmany(BATCH_SIZE)
+        if not rows:
+            break
+        before = dest.total_changes
+        dest.executemany(insert, rows)
+        inserted += dest.total_changes - before
+        dest.commit()
+    return inserted
+
+
+def _copy_keyed_rows(source, dest, table, org=None):
+    """Copy the rows of one of `KEYED_TABLES` (optionally of one org); return the number inserted."""
+    return _copy_table(source, dest, table, KEYED_TABLES[table], org) or 0
+
+
+# Tables derived from metrics payloads, copied rather than rebuilt
+DERIVED_TABLES = ["daily_metrics"] + list(flatten.TABLES)
+
+
+def _copy_derived_rows(source, dest, org=None):
+    """Copy the derived tables; mark those the source cannot provide for a rebuild in `dest`."""
+    missing = []
+    for table in DERIVED_TABLES:
+        columns = [row[1] for row in dest.execute(f"PRAGMA table_info({table})")]
+        if _copy_table(source, dest, table, columns, org) is None:
+            missing.append(table)
+    if missing:
+        helpers.mark_rebuild_pending(dest, missing)
+        dest.commit()
+        print(f"Marked {', '.join(missing)} for a rebuild; run python -m utils.rebuild --pending")
+
+
+def to_sharded(db_path, shard_dir):
+    """Split a single-file database into one shard per org."""
+    source = sqlite3.connect(db_path)
+    generation = _read_generation(source)
+    orgs = [row[0] for row in source.execute("SELECT DISTINCT org FROM metrics ORDER BY org")]
+    total = 0
+    for org in orgs:
+        dest = helpers.open_database(sharding.shard_path(org, shard_dir))
+        inserted = _copy_rows(source, dest, org)
+        for table in KEYED_TABLES:
+            _copy_keyed_rows(source, dest, table, org)
+        _copy_derived_rows(source, dest, org)
+        dest.close()
+        print(f"{org}: {inserted} rows")
+        total += inserted
+    source.close()
+    catalog = sharding.open_catalog(shard_dir)
+    _set_generation(catalog, max(generation, _read_generation(catalog)) + 1)
+    catalog.close()
+    print(f"Migrated {total} rows from {db_path} into {len(orgs)} shards in {shard_dir}")
+
+
+def to_single(shard_dir, db_path):
+    """Merge every shard listed in the catalog into a single-file database."""
+    dest = helpers.open_database(db_path)
+    catalog = sharding.open_catalog(shard_dir)
+    generation = _read_generation(catalog)
+    catalog.close()
+    total = 0
+    shards = sharding.list_shards(shard_dir=shard_dir)
+    for org, path in shards:
+        source = sqlite3.connect(path)
+        inserted = _copy_rows(source, dest)
+        for table in KEYED_TABLES:
+            _copy_keyed_rows(source, dest, table)
+        _copy_derived_rows(source, dest)
+        source.close()
+        print(f"{org}: {inserted} rows")
+        total += inserted
+    _set_generation(dest, max(generation, _read_generation(dest)) + 1)
+    dest.close()
+    print(f"Migrated {total} rows from {len(shards)} shards in {shard_dir} into {db_path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("direction", choices=["to-sharded", "to-single"])
+    parser.add_argument("--db", required=True, help="Single-file database path")
+    parser.add_argument("--shard-dir", required=True, help="Directory of the shards and catalog")
+    args = parser.parse_args()
+    if args.direction == "to-sharded":
+        to_sharded(args.db, args.shard_dir)
+    else:
+        to_single(args.shard_dir, args.db)
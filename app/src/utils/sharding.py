@@ -0,0 +1,100 @@
+"""
+Optional per-org database layout.
+
+With `DB_LAYOUT=sharded` every organisation is stored in its own SQLite file
+under `SHARD_DIR`, so a large org's history does not slow down queries for the
+others and imports for different orgs can write in parallel. A small catalog
+database in the same directory lists the shards and holds the data
+generation. Each shard uses the regular schema from `helpers.ensure_schema`.
+
+The default `single` layout keeps every org in the `DB_NAME` file.
+"""
+import hashlib
+import os
+import re
+import sqlite3
+from datetime import datetime
+
+DEFAULT_SHARD_WORKERS = 4
+CATALOG_NAME = "catalog.db"
+
+
+def is_sharded():
+    return os.getenv("DB_LAYOUT", "single").strip().lower() == "sharded"
+
+
+def get_shard_dir():
+    """Directory holding the shards: `SHARD_DIR`, or a `shards` folder next to `DB_NAME`."""
+    shard_dir = os.getenv("SHARD_DIR")
+    if not shard_dir:
+        db_path = os.path.abspath(os.getenv("DB_NAME", "metrics.db"))
+        shard_dir = os.path.join(os.path.dirname(db_path), "shards")
+    return os.path.abspath(shard_dir)
+
+
+def get_shard_workers():
+    return max(1, int(os.getenv("SHARD_WORKERS", DEFAULT_SHARD_WORKERS)))
+
+
+def safe_name(org):
+    """File system name for an org; the hash suffix keeps sanitized names unique."""
+    safe = re.sub(r"[^A-Za-z0-9_.-]", "_", org)
+    digest = hashlib.sha1(org.encode("utf-8")).hexdigest()[:8]
+    return f"{safe}-{digest}"
+
+
+def shard_file_name(org):
+    return f"{safe_name(org)}.db"
+
+
+def open_catalog(shard_dir=None):
+    """Open the catalog database, creating it and its tables if needed."""
+    shard_dir = shard_dir or get_shard_dir()
+    os.makedirs(shard_dir, exist_ok=True)
+    conn = sqlite3.connect(os.path.join(shard_dir, CATALOG_NAME), check_same_thread=False, timeout=30)
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS shards (
+            org TEXT PRIMARY KEY,
+            file TEXT NOT NULL,
+            created_at TEXT NOT NULL
+        )
+        """
+    )
+    conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+    conn.commit()
+    return conn
+
+
+def shard_path(org, shard_dir=None):
+    """
+    Return the shard file of an org, registering it in the catalog on first use.
+
+    Only writers should call this for orgs without a shard; readers go through
+    `list_shards` so querying an unknown org never creates a file.
+    """
+    shard_dir = shard_dir or get_shard_dir()
+    path = os.path.join(shard_dir, shard_file_name(org))
+    if not os.path.exists(path):
+        catalog = open_catalog(shard_dir)
+        try:
+            catalog.execute(
+                "INSERT OR IGNORE INTO shards (org, file, created_at) VALUES (?, ?, ?)",
+                (org, shard_file_name(org), datetime.now().isoformat(timespec="seconds")),
+            )
+            catalog.commit()
+        finally:
+            catalog.close()
+    return path
+
+
+def list_shards(orgs=None, shard_dir=None):
+    """Return `(org, path)` for the registered shards, restricted to `orgs` when given."""
+    shard_dir = shard_dir or get_shard_dir()
+    catalog = open_catalog(shard_dir)
+    try:
+        rows = catalog.execute("SELECT org, file FROM shards ORDER BY org").fetchall()
+    finally:
+        catalog.close()
+    selected = set(orgs) if orgs else None
+    return [(org, os.path.join(shard_dir, file)) for org, file in rows if selected is None or org in selected]